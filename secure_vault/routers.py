@@ -0,0 +1,79 @@
+"""Primary/replica database routing.
+
+With a `replica` alias configured (DATABASE_REPLICA_URL), reads go to the
+replica and every write goes to `default`. A client that has just written
+keeps reading from the primary for DATABASE_REPLICA_PIN_SECONDS, so it
+never sees its own upload or delete missing because of replication lag.
+"""
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+REPLICA = 'replica'
+PIN_COOKIE = 'vault_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+# Set per request (and copied into worker threads) while reads must use the primary
+use_primary = ContextVar('use_primary', default=False)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if REPLICA not in settings.DATABASES or use_primary.get():
+            return 'default'
+        # Reads inside a transaction must see that transaction's own writes
+        if connections['default'].in_atomic_block:
+            return 'default'
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA
+
+
+class ReplicaPinningMiddleware:
+    """Route a request's reads to the primary if it writes or follows a recent write."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = use_primary.set(self._pinned(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            use_primary.reset(token)
+        return self._pin(request, response)
+
+    async def __acall__(self, request):
+        token = use_primary.set(self._pinned(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            use_primary.reset(token)
+        return self._pin(request, response)
+
+    def _pinned(self, request) -> bool:
+        return request.method not in SAFE_METHODS or PIN_COOKIE in request.COOKIES
+
+    def _pin(self, request, response):
+        if request.method not in SAFE_METHODS and REPLICA in settings.DATABASES:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.DATABASE_REPLICA_PIN_SECONDS,
+                secure=settings.SESSION_COOKIE_SECURE, httponly=True, samesite='Lax',
+            )
+        return response
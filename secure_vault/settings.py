@@ -52,10 +52,11 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'secure_vault.routers.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'users.middleware.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -78,6 +79,16 @@ TEMPLATES = [
     },
 ]
 
+# Compile templates once per process in production (loaders replace APP_DIRS)
+if not DEBUG:
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
 WSGI_APPLICATION = 'secure_vault.wsgi.application'
 
 
@@ -92,6 +103,46 @@ DATABASES = {
     )
 }
 
+# Optional read replica: reads go to it, writes go to default, and clients read from default for
+# DATABASE_REPLICA_PIN_SECONDS after a write. Locally, point it at a second SQLite file kept in
+# step with `python manage.py sync_replica`
+DATABASE_REPLICA_URL = os.getenv('DATABASE_REPLICA_URL')
+if DATABASE_REPLICA_URL:
+    DATABASES['replica'] = dj_database_url.parse(DATABASE_REPLICA_URL, conn_max_age=600)
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+DATABASE_ROUTERS = ['secure_vault.routers.PrimaryReplicaRouter']
+DATABASE_REPLICA_PIN_SECONDS = int(os.getenv('DATABASE_REPLICA_PIN_SECONDS', 5))
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+# Local memory by default. CACHE_BACKEND plugs in a backend shared by all workers, e.g.
+# django.core.cache.backends.redis.RedisCache with a redis:// CACHE_LOCATION. The cache holds
+# sessions and user rows, so a FileBasedCache directory must be private to the app user
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv('CACHE_LOCATION', 'secure-vault'),
+        'TIMEOUT': int(os.getenv('CACHE_TIMEOUT', 300)),
+    }
+}
+
+# A per-process cache never sees logouts or invalidations from other workers, so sessions, user
+# rows and listings are only cached when the backend is shared
+CACHE_IS_SHARED = CACHE_BACKEND not in (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+# Sessions are read from the cache and written through to the database
+SESSION_ENGINE = (
+    'django.contrib.sessions.backends.cached_db' if CACHE_IS_SHARED else 'django.contrib.sessions.backends.db'
+)
+
+# Seconds a rendered file table or activity list is reused; edits also invalidate them
+VAULT_FRAGMENT_CACHE_TTL = int(os.getenv('VAULT_FRAGMENT_CACHE_TTL', 60)) if CACHE_IS_SHARED else 0
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -134,6 +185,15 @@ STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 
+# Hashed, compressed static file names so browsers can cache them indefinitely; turn on where
+# the build runs collectstatic. Files missing from the manifest are linked by their plain name
+STATIC_MANIFEST = os.getenv('STATIC_MANIFEST', 'False') == 'True'
+if STATIC_MANIFEST:
+    STORAGES = {
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'secure_vault.staticfiles.ManifestStaticFilesStorage'},
+    }
+
 # Media files (Uploaded files)
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
@@ -141,11 +201,89 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # Encrypted files storage - use environment variable on Render
 ENCRYPTED_FILES_ROOT = os.getenv('ENCRYPTED_FILES_ROOT', str(BASE_DIR / 'encrypted_files'))
 
+# Backend holding ciphertext blobs (sharded on disk under ENCRYPTED_FILES_ROOT by default)
+VAULT_BLOB_STORE = {
+    'BACKEND': 'vault.storage.FileSystemBlobStore',
+    'OPTIONS': {
+        'root': os.path.join(ENCRYPTED_FILES_ROOT, 'blobs'),
+    },
+}
+
+# Plaintext bytes per authenticated chunk when encrypting uploads
+VAULT_CHUNK_SIZE = int(os.getenv('VAULT_CHUNK_SIZE', 64 * 1024))
+
+# Bounded pool running KDF and cipher work; requests get 503 + Retry-After when it is full
+VAULT_CRYPTO_WORKERS = int(os.getenv('VAULT_CRYPTO_WORKERS', os.cpu_count() or 2))
+VAULT_CRYPTO_QUEUE = int(os.getenv('VAULT_CRYPTO_QUEUE', 16))
+VAULT_CRYPTO_QUEUE_WAIT = float(os.getenv('VAULT_CRYPTO_QUEUE_WAIT', 30))
+VAULT_CRYPTO_RETRY_AFTER = int(os.getenv('VAULT_CRYPTO_RETRY_AFTER', 5))
+
+# Chunks decrypted per pool job while a download streams. Each download holds one batch, about
+# VAULT_CRYPTO_STREAM_BATCH * VAULT_CHUNK_SIZE bytes (more while decompressing), at a time
+VAULT_CRYPTO_STREAM_BATCH = int(os.getenv('VAULT_CRYPTO_STREAM_BATCH', 4))
+
+# Compression applied before encryption: 'zlib', 'lzma' or '' to disable. Uploads with an
+# already-compressed type or a first chunk above the entropy limit (bits/byte) are stored as is
+VAULT_COMPRESSION = os.getenv('VAULT_COMPRESSION', 'zlib')
+VAULT_COMPRESSION_LEVEL = int(os.getenv('VAULT_COMPRESSION_LEVEL', 6))
+VAULT_COMPRESSION_MAX_ENTROPY = float(os.getenv('VAULT_COMPRESSION_MAX_ENTROPY', 7.5))
+VAULT_COMPRESSION_MIN_SIZE = int(os.getenv('VAULT_COMPRESSION_MIN_SIZE', 512))
+
+# Rewrite legacy CBC files in the current format when they are next downloaded. Only files whose
+# padding confirms the password over at least this many bytes are rewritten
+VAULT_LAZY_UPGRADE = os.getenv('VAULT_LAZY_UPGRADE', 'True') == 'True'
+VAULT_UPGRADE_MIN_PADDING = int(os.getenv('VAULT_UPGRADE_MIN_PADDING', 4))
+
+# Encrypted JPEG previews built for image uploads (longest side in pixels)
+VAULT_THUMBNAIL_SIZE = int(os.getenv('VAULT_THUMBNAIL_SIZE', 320))
+VAULT_THUMBNAIL_QUALITY = int(os.getenv('VAULT_THUMBNAIL_QUALITY', 80))
+
+# Offer in-browser encryption on the upload page: the browser derives the key and encrypts with
+# WebCrypto in the same chunked format, and the server stores and serves the ciphertext as is
+VAULT_CLIENT_ENCRYPTION = os.getenv('VAULT_CLIENT_ENCRYPTION', 'False') == 'True'
+
+# Serve upload, download and listing from the async views; turn on when running under ASGI
+VAULT_ASYNC_VIEWS = os.getenv('VAULT_ASYNC_VIEWS', 'False') == 'True'
+
+# Bulk uploads: files accepted per request and files encrypting at once per request
+VAULT_BULK_UPLOAD_MAX_FILES = int(os.getenv('VAULT_BULK_UPLOAD_MAX_FILES', 100))
+VAULT_BULK_UPLOAD_WORKERS = int(os.getenv('VAULT_BULK_UPLOAD_WORKERS', 4))
+
+# Rows per page on the file listing and access log pages
+VAULT_FILES_PER_PAGE = int(os.getenv('VAULT_FILES_PER_PAGE', 50))
+VAULT_LOGS_PER_PAGE = int(os.getenv('VAULT_LOGS_PER_PAGE', 50))
+
+# Largest page a JSON API client may ask for with ?limit=
+VAULT_API_MAX_PAGE_SIZE = int(os.getenv('VAULT_API_MAX_PAGE_SIZE', 500))
+
+# Buffered FileAccessLog writes, flushed with bulk_create by a background thread
+VAULT_ACCESS_LOG_BUFFERED = os.getenv('VAULT_ACCESS_LOG_BUFFERED', 'True') == 'True'
+VAULT_ACCESS_LOG_BATCH_SIZE = int(os.getenv('VAULT_ACCESS_LOG_BATCH_SIZE', 100))
+VAULT_ACCESS_LOG_FLUSH_INTERVAL = float(os.getenv('VAULT_ACCESS_LOG_FLUSH_INTERVAL', 1.0))
+VAULT_ACCESS_LOG_MAX_QUEUE = int(os.getenv('VAULT_ACCESS_LOG_MAX_QUEUE', 10000))
+
+# `manage.py archive_access_logs` rolls entries older than this into daily counts, exports them as
+# gzipped JSONL segments under VAULT_ACCESS_LOG_ARCHIVE_ROOT and deletes them from the table
+VAULT_ACCESS_LOG_RETENTION_DAYS = int(os.getenv('VAULT_ACCESS_LOG_RETENTION_DAYS', 90))
+VAULT_ACCESS_LOG_ARCHIVE_ROOT = os.getenv(
+    'VAULT_ACCESS_LOG_ARCHIVE_ROOT', os.path.join(ENCRYPTED_FILES_ROOT, 'access_log_archive')
+)
+
+# In-process cache of password-derived keys per login session (0 disables)
+VAULT_KEY_CACHE_SIZE = int(os.getenv('VAULT_KEY_CACHE_SIZE', 256))
+VAULT_KEY_CACHE_TTL = int(os.getenv('VAULT_KEY_CACHE_TTL', 300))
+
+# Allow one form field per file in bulk uploads
+DATA_UPLOAD_MAX_NUMBER_FILES = VAULT_BULK_UPLOAD_MAX_FILES
+
 # Authentication settings
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'dashboard'
 LOGOUT_REDIRECT_URL = 'login'
 
+# Seconds the logged-in user row is reused from the cache between requests (0 disables)
+AUTH_USER_CACHE_TTL = int(os.getenv('AUTH_USER_CACHE_TTL', 60)) if CACHE_IS_SHARED else 0
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -164,3 +302,17 @@ SESSION_COOKIE_SECURE = not DEBUG
 
 # Custom User Model
 AUTH_USER_MODEL = 'users.CustomUser'
+
+# Face login: largest encoding distance accepted as a match (face_recognition's default)
+FACE_MATCH_TOLERANCE = float(os.getenv('FACE_MATCH_TOLERANCE', 0.6))
+
+# Face login without a username picks the closest of all enrolled users, so it needs a stricter
+# distance and the runner-up must be at least FACE_IDENTIFY_MARGIN further away
+FACE_IDENTIFY_TOLERANCE = float(os.getenv('FACE_IDENTIFY_TOLERANCE', 0.45))
+FACE_IDENTIFY_MARGIN = float(os.getenv('FACE_IDENTIFY_MARGIN', 0.1))
+
+# Warm face encoding worker processes; frames are downscaled to FACE_MAX_DIMENSION pixels first
+FACE_POOL_WORKERS = int(os.getenv('FACE_POOL_WORKERS', 1))
+FACE_POOL_QUEUE = int(os.getenv('FACE_POOL_QUEUE', 8))
+FACE_ENCODING_TIMEOUT = float(os.getenv('FACE_ENCODING_TIMEOUT', 10))
+FACE_MAX_DIMENSION = int(os.getenv('FACE_MAX_DIMENSION', 640))
@@ -0,0 +1,16 @@
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+class ManifestStaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """Hashed, compressed static files that fall back to plain names without a manifest.
+
+    Pages still render when `collectstatic` has not been run (tests, local runs);
+    they just link the unhashed files.
+    """
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'secure_vault.settings')
 
 application = get_wsgi_application()
+
+# Load the face models in their worker processes before the first face login
+from users.face_utils import FACE_AUTH_AVAILABLE  # noqa: E402
+
+if FACE_AUTH_AVAILABLE:
+    from users.face_pool import face_pool  # noqa: E402
+    face_pool.start()
@@ -0,0 +1,181 @@
+/*
+ * In-browser encryption in the vault's chunked AES-256-GCM format (see vault/utils.py).
+ *
+ * Files are encrypted under a random data key, wrapped with AES-KW under a
+ * PBKDF2-SHA256 key derived from the password, exactly as the server does,
+ * so the password and plaintext never leave the browser. The KAT_* vector
+ * in vault/tests.py pins the byte-for-byte output both sides must agree on.
+ */
+const VaultCrypto = (() => {
+    const MAGIC = [0x53, 0x56, 0x4c, 0x54]; // 'SVLT'
+    const FORMAT_CHUNKED_GCM = 2;
+    const HEADER_SIZE = 32;
+    const SALT_SIZE = 16;
+    const NONCE_PREFIX_SIZE = 7;
+    const TAG_SIZE = 16;
+    const KDF_ITERATIONS = 100000;
+    const KEY_CHECK_LABEL = new TextEncoder().encode('secure-vault key check');
+
+    function toBase64(bytes) {
+        return btoa(String.fromCharCode(...bytes));
+    }
+
+    function fromBase64(text) {
+        return Uint8Array.from(atob(text), c => c.charCodeAt(0));
+    }
+
+    function sameBytes(a, b) {
+        if (a.length !== b.length) return false;
+        let diff = 0;
+        for (let i = 0; i < a.length; i++) diff |= a[i] ^ b[i];
+        return diff === 0;
+    }
+
+    // Password-derived key: wraps the data key and proves the password via the key check
+    async function deriveKeys(password, salt) {
+        const material = await crypto.subtle.importKey(
+            'raw', new TextEncoder().encode(password), 'PBKDF2', false, ['deriveBits']
+        );
+        const bits = await crypto.subtle.deriveBits(
+            {name: 'PBKDF2', hash: 'SHA-256', salt, iterations: KDF_ITERATIONS}, material, 256
+        );
+        const wrapping = await crypto.subtle.importKey('raw', bits, 'AES-KW', false, ['wrapKey', 'unwrapKey']);
+        const mac = await crypto.subtle.importKey('raw', bits, {name: 'HMAC', hash: 'SHA-256'}, false, ['sign']);
+        const keyCheck = new Uint8Array(await crypto.subtle.sign('HMAC', mac, KEY_CHECK_LABEL)).slice(0, 16);
+        return {wrapping, keyCheck};
+    }
+
+    function buildHeader(chunkSize, salt, noncePrefix) {
+        const header = new Uint8Array(HEADER_SIZE);
+        const view = new DataView(header.buffer);
+        header.set(MAGIC, 0);
+        view.setUint8(4, FORMAT_CHUNKED_GCM);
+        view.setUint32(5, chunkSize);
+        header.set(salt, 9);
+        header.set(noncePrefix, 9 + SALT_SIZE);
+        return header;
+    }
+
+    function parseHeader(header) {
+        const view = new DataView(header.buffer, header.byteOffset, HEADER_SIZE);
+        if (!MAGIC.every((b, i) => header[i] === b) || view.getUint8(4) !== FORMAT_CHUNKED_GCM) {
+            throw new Error('Unsupported encrypted file format');
+        }
+        return {
+            chunkSize: view.getUint32(5),
+            noncePrefix: header.slice(9 + SALT_SIZE, HEADER_SIZE),
+        };
+    }
+
+    // 96-bit nonce: prefix, chunk counter and a last-chunk flag
+    function chunkNonce(noncePrefix, counter, last) {
+        const nonce = new Uint8Array(12);
+        nonce.set(noncePrefix, 0);
+        new DataView(nonce.buffer).setUint32(NONCE_PREFIX_SIZE, counter);
+        nonce[11] = last ? 1 : 0;
+        return nonce;
+    }
+
+    /*
+     * Encrypt a File chunk by chunk under the password and the user's key
+     * salt (base64; a random one if missing). Resolves to the ciphertext Blob
+     * and the key material the server stores alongside it.
+     */
+    async function encryptFile(file, password, keySalt, chunkSize, onProgress) {
+        const salt = keySalt ? fromBase64(keySalt) : crypto.getRandomValues(new Uint8Array(SALT_SIZE));
+        const noncePrefix = crypto.getRandomValues(new Uint8Array(NONCE_PREFIX_SIZE));
+        const {wrapping, keyCheck} = await deriveKeys(password, salt);
+        const dataKey = await crypto.subtle.generateKey({name: 'AES-GCM', length: 256}, true, ['encrypt']);
+        const wrappedKey = new Uint8Array(await crypto.subtle.wrapKey('raw', dataKey, wrapping, 'AES-KW'));
+
+        const header = buildHeader(chunkSize, salt, noncePrefix);
+        const parts = [header];
+        const count = Math.max(1, Math.ceil(file.size / chunkSize));
+        for (let i = 0; i < count; i++) {
+            const plain = await file.slice(i * chunkSize, (i + 1) * chunkSize).arrayBuffer();
+            parts.push(await crypto.subtle.encrypt(
+                {name: 'AES-GCM', iv: chunkNonce(noncePrefix, i, i === count - 1), additionalData: header},
+                dataKey, plain
+            ));
+            if (onProgress) onProgress((i + 1) / count);
+        }
+        return {
+            ciphertext: new Blob(parts, {type: 'application/octet-stream'}),
+            salt, noncePrefix, keyCheck, wrappedKey,
+        };
+    }
+
+    /*
+     * Check the password against a file's stored key check and unwrap its
+     * data key. Key material is base64 as rendered into the page.
+     */
+    async function openKey(password, material) {
+        const {wrapping, keyCheck} = await deriveKeys(password, fromBase64(material.salt));
+        if (material.keyCheck && !sameBytes(keyCheck, fromBase64(material.keyCheck))) {
+            throw new Error('Invalid password');
+        }
+        try {
+            return await crypto.subtle.unwrapKey(
+                'raw', fromBase64(material.wrappedKey), wrapping, 'AES-KW', 'AES-GCM', false, ['decrypt']
+            );
+        } catch (e) {
+            throw new Error('Invalid password');
+        }
+    }
+
+    function concat(a, b) {
+        const joined = new Uint8Array(a.length + b.length);
+        joined.set(a, 0);
+        joined.set(b, a.length);
+        return joined;
+    }
+
+    /*
+     * Decrypt a ciphertext ReadableStream into an array of plaintext chunks.
+     * A chunk is only known to be the last once the stream ends behind it,
+     * so one sealed chunk is always held back.
+     */
+    async function decryptStream(stream, dataKey) {
+        const reader = stream.getReader();
+        const parts = [];
+        let buffer = new Uint8Array(0);
+        let header = null, noncePrefix = null, sealedSize = 0, counter = 0, done = false;
+
+        async function open(sealed, last) {
+            try {
+                return await crypto.subtle.decrypt(
+                    {name: 'AES-GCM', iv: chunkNonce(noncePrefix, counter++, last), additionalData: header},
+                    dataKey, sealed
+                );
+            } catch (e) {
+                throw new Error('Invalid password or corrupted file');
+            }
+        }
+
+        while (!done) {
+            const result = await reader.read();
+            done = result.done;
+            if (!done) buffer = concat(buffer, result.value);
+
+            if (!header) {
+                if (buffer.length < HEADER_SIZE) {
+                    if (done) throw new Error('Encrypted file is truncated');
+                    continue;
+                }
+                header = buffer.slice(0, HEADER_SIZE);
+                const parsed = parseHeader(header);
+                noncePrefix = parsed.noncePrefix;
+                sealedSize = parsed.chunkSize + TAG_SIZE;
+                buffer = buffer.slice(HEADER_SIZE);
+            }
+            while (buffer.length > sealedSize) {
+                parts.push(await open(buffer.slice(0, sealedSize), false));
+                buffer = buffer.slice(sealedSize);
+            }
+        }
+        parts.push(await open(buffer, true));
+        return parts;
+    }
+
+    return {encryptFile, openKey, decryptStream, toBase64};
+})();
@@ -0,0 +1,133 @@
+import threading
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from .face_utils import ENCODING_DTYPE, ENCODING_SIZE, decode_face_data, encode_face_data, is_legacy_face_data, np
+
+
+class FaceIndex:
+    """In-memory matrix of every enrolled face encoding for 1:N matching.
+
+    Rows are float32 encodings, one per user with face auth enabled, so a
+    match is a single vectorised distance computation over the matrix.
+    The index loads lazily and then follows the users table incrementally:
+    each refresh only reads rows whose updated_at is at or after the newest
+    one already seen, which also picks up enrolments made by other worker
+    processes. Changes made in this process are applied immediately with
+    `upsert` and `remove`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._user_ids = []
+        self._positions = {}
+        self._synced_at = None
+
+    def __len__(self):
+        return len(self._user_ids)
+
+    def refresh(self) -> None:
+        """Pull enrolments changed since the last refresh from the database."""
+        User = get_user_model()
+        users = User.objects.all()
+        if self._synced_at is not None:
+            users = users.filter(updated_at__gte=self._synced_at)
+        else:
+            users = users.filter(use_face_auth=True, is_active=True, face_encoding__isnull=False)
+        rows = list(users.values_list('pk', 'use_face_auth', 'is_active', 'face_encoding', 'updated_at'))
+
+        legacy = []
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.empty((0, ENCODING_SIZE), dtype=ENCODING_DTYPE)
+            changes = []
+            for user_id, use_face_auth, is_active, face_data, updated_at in rows:
+                encoding = decode_face_data(face_data) if use_face_auth and is_active else None
+                changes.append((user_id, encoding))
+                if encoding is not None and is_legacy_face_data(face_data):
+                    legacy.append((user_id, encoding))
+                if self._synced_at is None or updated_at > self._synced_at:
+                    self._synced_at = updated_at
+            self._apply(changes)
+
+        for user_id, encoding in legacy:
+            # Rewrite pickled encodings as float32 without touching updated_at
+            User.objects.filter(pk=user_id).update(face_encoding=encode_face_data(encoding))
+
+    def upsert(self, user_id, encoding) -> None:
+        with self._lock:
+            if self._matrix is not None:
+                self._apply([(user_id, np.asarray(encoding, dtype=ENCODING_DTYPE))])
+
+    def remove(self, user_id) -> None:
+        with self._lock:
+            if self._matrix is not None:
+                self._remove(user_id)
+
+    def match(self, encoding, user_id=None):
+        """Return the id of the enrolled user `encoding` belongs to, or None.
+
+        With `user_id`, only that user's encoding is compared (1:1
+        verification, within FACE_MATCH_TOLERANCE). Without it the closest of
+        all users must be within the stricter FACE_IDENTIFY_TOLERANCE and at
+        least FACE_IDENTIFY_MARGIN closer than the runner-up; ambiguous
+        matches return None.
+        """
+        self.refresh()
+        encoding = np.asarray(encoding, dtype=ENCODING_DTYPE)
+        with self._lock:
+            if user_id is not None:
+                position = self._positions.get(user_id)
+                if position is None:
+                    return None
+                distance = float(np.linalg.norm(self._matrix[position] - encoding))
+                return user_id if distance <= settings.FACE_MATCH_TOLERANCE else None
+            if not self._user_ids:
+                return None
+            distances = np.linalg.norm(self._matrix - encoding, axis=1)
+            if len(distances) == 1:
+                best, runner_up = 0, None
+            else:
+                # The two smallest distances, without sorting the rest
+                best, runner_up = sorted(np.argpartition(distances, 1)[:2], key=lambda i: distances[i])
+            if distances[best] > settings.FACE_IDENTIFY_TOLERANCE:
+                return None
+            if runner_up is not None and distances[runner_up] - distances[best] < settings.FACE_IDENTIFY_MARGIN:
+                return None
+            return self._user_ids[int(best)]
+
+    def _apply(self, changes) -> None:
+        """Apply (user_id, encoding or None) changes, growing the matrix once for all new rows."""
+        for user_id, encoding in changes:
+            if encoding is None:
+                self._remove(user_id)
+        added = []
+        for user_id, encoding in changes:
+            if encoding is None:
+                continue
+            position = self._positions.get(user_id)
+            if position is not None:
+                self._matrix[position] = encoding
+                continue
+            self._positions[user_id] = len(self._user_ids)
+            self._user_ids.append(user_id)
+            added.append(encoding)
+        if added:
+            self._matrix = np.vstack([self._matrix, np.stack(added)])
+
+    def _remove(self, user_id) -> None:
+        position = self._positions.pop(user_id, None)
+        if position is None:
+            return
+        # Move the last row into the gap so removal stays O(1)
+        last = len(self._user_ids) - 1
+        if position != last:
+            moved_id = self._user_ids[last]
+            self._matrix[position] = self._matrix[last]
+            self._user_ids[position] = moved_id
+            self._positions[moved_id] = position
+        self._user_ids.pop()
+        self._matrix = self._matrix[:last]
+
+
+face_index = FaceIndex()
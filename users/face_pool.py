@@ -0,0 +1,110 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from .face_utils import ENCODING_DTYPE, get_face_encoding, np, process_base64_image
+
+
+class FacePoolBusy(Exception):
+    """Raised when face encoding cannot be done in time or the queue is full."""
+
+
+def _warm_worker():
+    # Importing face_recognition loads the detection and encoding models
+    import face_recognition
+    face_recognition.face_encodings(np.zeros((64, 64, 3), dtype=np.uint8))
+
+
+def encode_frame(image_data: str, max_dimension: int):
+    """Decode, downscale and encode one frame in a pool worker; returns float32 bytes or None."""
+    encoding = get_face_encoding(process_base64_image(image_data, max_dimension))
+    return None if encoding is None else encoding.tobytes()
+
+
+class FaceEncoderPool:
+    """Process pool that keeps the face models loaded in a few warm workers.
+
+    Request workers never import face_recognition themselves; they hand the
+    frame to the pool and wait up to `timeout` seconds. At most
+    `max_workers` frames are encoded at once and `max_queue` more may wait.
+    Beyond that, or on timeout, FacePoolBusy is raised so the view can answer
+    503 instead of stalling.
+    """
+
+    def __init__(self, max_workers: int = 1, max_queue: int = 8, timeout: float = 10):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+        self.submitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def start(self) -> None:
+        """Spawn and warm the workers now rather than on the first login."""
+        pool = self._get_pool()
+        for _ in range(self.max_workers):
+            pool.submit(_warm_worker)
+
+    def encode(self, image_data: str):
+        """Return the float32 encoding of the face in a base64 frame, or None if there is none."""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise FacePoolBusy('Face recognition workers are busy')
+        try:
+            future = self._get_pool().submit(encode_frame, image_data, settings.FACE_MAX_DIMENSION)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        with self._lock:
+            self.submitted += 1
+
+        try:
+            data = future.result(timeout=self.timeout)
+        except TimeoutError:
+            with self._lock:
+                self.timed_out += 1
+            raise FacePoolBusy('Face recognition timed out')
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); start a fresh pool next time
+            with self._lock:
+                self._pool = None
+            raise FacePoolBusy('Face recognition workers restarted')
+        return None if data is None else np.frombuffer(data, dtype=ENCODING_DTYPE)
+
+    def metrics(self) -> dict:
+        return {
+            'workers': self.max_workers,
+            'queue_capacity': self.max_queue,
+            'submitted': self.submitted,
+            'rejected': self.rejected,
+            'timed_out': self.timed_out,
+        }
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        # Forked workers inherit the object but not the pool's processes and threads
+        if self._pool is None or self._pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pid != os.getpid():
+                    self._pid = os.getpid()
+                    # Spawned rather than forked, so workers do not inherit request threads
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=multiprocessing.get_context('spawn'),
+                        initializer=_warm_worker,
+                    )
+        return self._pool
+
+
+face_pool = FaceEncoderPool(
+    max_workers=getattr(settings, 'FACE_POOL_WORKERS', 1),
+    max_queue=getattr(settings, 'FACE_POOL_QUEUE', 8),
+    timeout=getattr(settings, 'FACE_ENCODING_TIMEOUT', 10),
+)
@@ -1,29 +1,96 @@
-# Face recognition disabled for Render deployment
-# import face_recognition
-# import numpy as np
+# Face recognition is optional: face_recognition (dlib) and numpy are not
+# installed on the Render deployment, where face auth reports itself unavailable.
+# face_recognition loads its models on import, so only face pool workers import it.
+try:
+    import numpy as np
+except ImportError:
+    np = None
 from typing import Optional, Tuple
 import base64
+import importlib.util
 import re
 import io
 from PIL import Image
 import pickle
+from django.conf import settings
 
-def process_base64_image(base64_string):
-    """Convert base64 image data to numpy array - DISABLED."""
-    return None
+FACE_AUTH_AVAILABLE = np is not None and importlib.util.find_spec('face_recognition') is not None
+
+# Encodings are stored as raw little-endian float32, 128 values per face
+ENCODING_SIZE = 128
+ENCODING_DTYPE = '<f4'
+
+def process_base64_image(base64_string, max_dimension: int = None):
+    """Convert base64 image data to an RGB numpy array, or None if it cannot be read.
+
+    Frames are shrunk to at most `max_dimension` pixels on their longest
+    side; for JPEGs the decoder itself scales down, so the full-resolution
+    bitmap is never built.
+    """
+    if not FACE_AUTH_AVAILABLE or not base64_string:
+        return None
+    try:
+        # Strip a data URL prefix such as "data:image/jpeg;base64,"
+        base64_string = re.sub(r'^data:image/[^;]+;base64,', '', base64_string)
+        image = Image.open(io.BytesIO(base64.b64decode(base64_string)))
+        if max_dimension:
+            image.draft('RGB', (max_dimension, max_dimension))
+        image = image.convert('RGB')
+        if max_dimension:
+            image.thumbnail((max_dimension, max_dimension))
+        return np.array(image)
+    except Exception as e:
+        print(f"Error processing image: {str(e)}")
+        return None
 
 def get_face_encoding(image_array):
-    """Get face encoding from image array - DISABLED."""
-    return None
+    """Get the encoding of the first face in an image array, or None if there is none.
+
+    Faces are located on a grayscale copy, which is all the HOG detector
+    needs, and only the first face is encoded from the colour frame.
+    """
+    if not FACE_AUTH_AVAILABLE or image_array is None:
+        return None
+    import face_recognition
+
+    grayscale = np.asarray(Image.fromarray(image_array).convert('L'))
+    locations = face_recognition.face_locations(grayscale)
+    if not locations:
+        return None
+    encodings = face_recognition.face_encodings(image_array, known_face_locations=locations[:1])
+    if not encodings:
+        return None
+    return np.asarray(encodings[0], dtype=ENCODING_DTYPE)
 
 def verify_face(stored_encoding, image_array):
-    """Verify if the face matches the stored encoding - DISABLED."""
-    return False
+    """Verify if the face in an image matches one stored encoding."""
+    encoding = get_face_encoding(image_array)
+    stored = decode_face_data(stored_encoding)
+    if encoding is None or stored is None:
+        return False
+    return float(np.linalg.norm(stored - encoding)) <= settings.FACE_MATCH_TOLERANCE
 
 def encode_face_data(face_encoding):
-    """Serialize face encoding for storage - DISABLED."""
-    return None
+    """Serialize a face encoding for storage as 512 bytes of float32."""
+    if np is None or face_encoding is None:
+        return None
+    return np.asarray(face_encoding, dtype=ENCODING_DTYPE).tobytes()
 
 def decode_face_data(face_data: bytes):
-    """Convert stored face data bytes back to numpy array - DISABLED."""
-    return None 
\ No newline at end of file
+    """Convert stored face data back to a float32 numpy array.
+
+    Rows enrolled before the float32 format hold a pickled float64 array;
+    those are still read so they can be rewritten.
+    """
+    if np is None or not face_data:
+        return None
+    face_data = bytes(face_data)
+    if len(face_data) == ENCODING_SIZE * 4:
+        return np.frombuffer(face_data, dtype=ENCODING_DTYPE)
+    if is_legacy_face_data(face_data):
+        return np.asarray(pickle.loads(face_data), dtype=ENCODING_DTYPE).reshape(ENCODING_SIZE)
+    return None
+
+def is_legacy_face_data(face_data: bytes) -> bool:
+    """Whether stored face data is in the old pickle format."""
+    return bool(face_data) and bytes(face_data[:1]) == b'\x80'
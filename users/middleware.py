@@ -0,0 +1,73 @@
+from functools import partial
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.core.cache import cache
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+USER_KEY = 'auth:user:{user_id}'
+
+
+def user_key(user_id) -> str:
+    return USER_KEY.format(user_id=user_id)
+
+
+def forget_user(user_id) -> None:
+    """Drop a cached user row so the next request reads it from the database."""
+    cache.delete(user_key(user_id))
+
+
+def get_cached_user(request):
+    """Same result as auth.get_user, reusing the user row cached by an earlier request.
+
+    A cached row is only trusted when the session's auth hash matches it
+    exactly; anything else (password changed, rotated secret, logged out)
+    goes through auth.get_user, which re-reads the row and flushes
+    sessions that no longer verify.
+    """
+    ttl = getattr(settings, 'AUTH_USER_CACHE_TTL', 0)
+    user_id = request.session.get(auth.SESSION_KEY)
+    if not ttl or user_id is None:
+        return auth.get_user(request)
+
+    key = user_key(user_id)
+    user = cache.get(key)
+    session_hash = request.session.get(auth.HASH_SESSION_KEY)
+    if (user is not None and session_hash and user.is_active
+            and request.session.get(auth.BACKEND_SESSION_KEY) in settings.AUTHENTICATION_BACKENDS
+            and constant_time_compare(session_hash, user.get_session_auth_hash())):
+        return user
+
+    user = auth.get_user(request)
+    if user.is_authenticated and constant_time_compare(
+            request.session.get(auth.HASH_SESSION_KEY) or '', user.get_session_auth_hash()):
+        cache.set(key, user, ttl)
+    return user
+
+
+def _get_user(request):
+    if not hasattr(request, '_cached_user'):
+        request._cached_user = get_cached_user(request)
+    return request._cached_user
+
+
+async def _auser(request):
+    if not hasattr(request, '_acached_user'):
+        request._acached_user = await sync_to_async(get_cached_user)(request)
+    return request._acached_user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """AuthenticationMiddleware that skips the user query while the row is cached.
+
+    Entries are dropped whenever the user is saved or deleted (see
+    users.signals) and expire after AUTH_USER_CACHE_TTL seconds. Caching is
+    off (a TTL of 0) unless the cache backend is shared between workers.
+    """
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: _get_user(request))
+        request.auser = partial(_auser, request)
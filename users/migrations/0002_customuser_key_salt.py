@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='key_salt',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
@@ -1,11 +1,13 @@
+import os
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
 
 # Create your models here.
 
 class CustomUser(AbstractUser):
     face_encoding = models.BinaryField(null=True, blank=True)
     use_face_auth = models.BooleanField(default=False)
+    key_salt = models.BinaryField(null=True, blank=True)  # Salt every file password key of this user is derived with
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -15,3 +17,19 @@ class CustomUser(AbstractUser):
 
     def __str__(self):
         return self.username
+
+    def get_key_salt(self) -> bytes:
+        """Salt for deriving this user's file password keys, created on first use.
+
+        Sharing one salt means one KDF opens (and re-keys) every file under the
+        same password.
+        """
+        if not self.key_salt:
+            with transaction.atomic():
+                # If two uploads race, only the first salt is kept
+                type(self).objects.filter(pk=self.pk, key_salt__isnull=True).update(key_salt=os.urandom(16))
+                self.key_salt = type(self).objects.values_list('key_salt', flat=True).get(pk=self.pk)
+            # update() skips the post_save signal that drops the cached user row
+            from .middleware import forget_user
+            forget_user(self.pk)
+        return bytes(self.key_salt)
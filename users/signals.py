@@ -0,0 +1,18 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .face_index import face_index
+from .middleware import forget_user
+
+
+@receiver(post_delete, sender=get_user_model())
+def drop_face_encoding(sender, instance, **kwargs):
+    """Remove a deleted user from this process's face match index."""
+    face_index.remove(instance.pk)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def drop_cached_user(sender, instance, **kwargs):
+    """Make the next request re-read a saved or deleted user."""
+    forget_user(instance.pk)
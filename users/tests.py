@@ -1,3 +1,56 @@
+from unittest import skipIf
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from .face_index import FaceIndex
+from .face_utils import ENCODING_SIZE, encode_face_data, np
 
-# Create your tests here.
+
+class KeySaltTests(TestCase):
+    def test_key_salt_is_created_once(self):
+        user = get_user_model().objects.create_user(username='alice', password='pw')
+        salt = user.get_key_salt()
+        self.assertEqual(len(salt), 16)
+        self.assertEqual(get_user_model().objects.get(pk=user.pk).get_key_salt(), salt)
+
+
+def face(**components):
+    """A face encoding that is zero except for the given `d<index>=value` components."""
+    encoding = np.zeros(ENCODING_SIZE)
+    for name, value in components.items():
+        encoding[int(name[1:])] = value
+    return encoding
+
+
+@skipIf(np is None, 'numpy is not installed')
+class FaceIndexTests(TestCase):
+    def setUp(self):
+        self.index = FaceIndex()
+        self.alice = self.enrol('alice', face(d0=1.0))
+        self.bob = self.enrol('bob', face(d1=1.0))
+
+    def enrol(self, username, encoding):
+        return get_user_model().objects.create_user(
+            username=username, password='pw', use_face_auth=True, face_encoding=encode_face_data(encoding)
+        )
+
+    def test_identifies_the_closest_user(self):
+        self.assertEqual(self.index.match(face(d0=1.0, d2=0.2)), self.alice.pk)
+        self.assertEqual(len(self.index), 2)
+
+    def test_identification_is_stricter_than_verification(self):
+        # 0.5 away: within FACE_MATCH_TOLERANCE but not FACE_IDENTIFY_TOLERANCE
+        probe = face(d0=1.0, d2=0.5)
+        self.assertIsNone(self.index.match(probe))
+        self.assertEqual(self.index.match(probe, user_id=self.alice.pk), self.alice.pk)
+        self.assertIsNone(self.index.match(probe, user_id=self.bob.pk))
+
+    def test_ambiguous_match_is_rejected(self):
+        self.enrol('carol', face(d0=1.0, d3=0.05))
+        self.assertIsNone(self.index.match(face(d0=1.0, d2=0.1)))
+
+    def test_follows_enrolment_changes(self):
+        self.assertEqual(self.index.match(face(d1=1.0)), self.bob.pk)
+        self.bob.use_face_auth = False
+        self.bob.save()
+        self.assertIsNone(self.index.match(face(d1=1.0)))
+        self.assertEqual(len(self.index), 1)
@@ -4,12 +4,16 @@ from django.contrib.auth.views import LoginView
 from django.contrib import messages
 from django.urls import reverse_lazy
 from django.contrib.auth import get_user_model, login
-from django.db.models import Sum, Count
+from django.conf import settings
 from .forms import CustomUserCreationForm, CustomAuthenticationForm, UserProfileForm
-from .face_utils import process_base64_image, get_face_encoding, verify_face, encode_face_data
+from .face_index import face_index
+from .face_pool import FacePoolBusy, face_pool
+from .face_utils import FACE_AUTH_AVAILABLE, encode_face_data
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
-from vault.models import EncryptedFile, FileAccessLog
+from vault.cache import bump_user_cache_version, fragment_context
+from vault.models import FileAccessLog
+from vault.stats import get_storage_stats
 import json
 
 class CustomLoginView(LoginView):
@@ -18,24 +22,22 @@ class CustomLoginView(LoginView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['enable_face_login'] = True
+        context['enable_face_login'] = FACE_AUTH_AVAILABLE
         return context
 
 @login_required
 def dashboard(request):
-    # Get user's file statistics
-    total_files = EncryptedFile.objects.filter(user=request.user).count()
-    total_size = EncryptedFile.objects.filter(user=request.user).aggregate(Sum('file_size'))['file_size__sum'] or 0
-    recent_activities = FileAccessLog.objects.filter(
-        file__user=request.user
-    ).select_related('file').order_by('-timestamp')[:5]
-    recent_activity_count = FileAccessLog.objects.filter(file__user=request.user).count()
+    # File statistics come from a single denormalized row
+    stats = get_storage_stats(request.user)
+    # Lazy: only queried when the cached activity fragment has to be rendered again
+    recent_activities = FileAccessLog.objects.filter(owner=request.user).order_by('-timestamp', '-id')[:5]
 
     context = {
-        'total_files': total_files,
-        'total_size': total_size,
+        'total_files': stats.file_count,
+        'total_size': stats.total_bytes,
         'recent_activities': recent_activities,
-        'recent_activity_count': recent_activity_count,
+        'recent_activity_count': stats.activity_count,
+        **fragment_context(request.user.pk),
     }
     return render(request, 'users/dashboard.html', context)
 
@@ -58,6 +60,7 @@ def profile(request):
             form = UserProfileForm(request.POST, instance=request.user)
             if form.is_valid():
                 form.save()
+                bump_user_cache_version(request.user.pk)
                 messages.success(request, 'Profile updated successfully.')
                 return redirect('profile')
         else:
@@ -75,6 +78,8 @@ def profile(request):
 @login_required
 @require_POST
 def face_setup(request):
+    if not FACE_AUTH_AVAILABLE:
+        return _face_auth_unavailable()
     try:
         data = json.loads(request.body)
         image_data = data.get('image')
@@ -85,16 +90,8 @@ def face_setup(request):
                 'message': 'No image data provided.'
             }, status=400)
         
-        # Process the image
-        image_array = process_base64_image(image_data)
-        if image_array is None:
-            return JsonResponse({
-                'success': False,
-                'message': 'Could not process the image. Please try again.'
-            }, status=400)
-        
-        # Get face encoding
-        face_encoding = get_face_encoding(image_array)
+        # Decode, downscale and encode the frame on the warm face pool
+        face_encoding = face_pool.encode(image_data)
         if face_encoding is None:
             return JsonResponse({
                 'success': False,
@@ -111,11 +108,17 @@ def face_setup(request):
         
         request.user.use_face_auth = True
         request.user.save()
+        bump_user_cache_version(request.user.pk)
+        
+        # Update this user's row in the match index rather than rebuilding it
+        face_index.upsert(request.user.pk, face_encoding)
         
         return JsonResponse({
             'success': True,
             'message': 'Face authentication setup successful.'
         })
+    except FacePoolBusy:
+        return _face_pool_busy()
     except json.JSONDecodeError:
         return JsonResponse({
             'success': False,
@@ -128,23 +131,56 @@ def face_setup(request):
             'message': 'An error occurred during setup.'
         }, status=500)
 
+def _face_auth_unavailable():
+    return JsonResponse({
+        'success': False,
+        'message': 'Face authentication is not available on this server.'
+    }, status=503)
+
+def _face_pool_busy():
+    response = JsonResponse({
+        'success': False,
+        'message': 'Face recognition is busy. Please try again shortly.'
+    }, status=503)
+    response['Retry-After'] = str(settings.VAULT_CRYPTO_RETRY_AFTER)
+    return response
+
 @require_POST
 def face_login(request):
+    if not FACE_AUTH_AVAILABLE:
+        return _face_auth_unavailable()
     try:
         data = json.loads(request.body)
         username = data.get('username')
-        image_data = process_base64_image(data.get('image'))
+        face_encoding = face_pool.encode(data.get('image')) if data.get('image') else None
         
-        User = get_user_model()
-        user = User.objects.filter(username=username, use_face_auth=True).first()
-        
-        if not user or not user.face_encoding:
+        if face_encoding is None:
             return JsonResponse({
                 'success': False,
-                'message': 'User not found or face authentication not set up.'
+                'message': 'No face detected in the image.'
             }, status=400)
         
-        if verify_face(user.face_encoding, image_data):
+        User = get_user_model()
+        user_id = None
+        if username:
+            # A username narrows the match to that user's encoding
+            user = User.objects.filter(username=username, use_face_auth=True).first()
+            if not user or not user.face_encoding:
+                return JsonResponse({
+                    'success': False,
+                    'message': 'User not found or face authentication not set up.'
+                }, status=400)
+            user_id = user.pk
+        
+        # One batched distance computation over every enrolled face
+        matched_id = face_index.match(face_encoding, user_id=user_id)
+        user = None
+        if matched_id is not None:
+            user = User.objects.filter(pk=matched_id, is_active=True, use_face_auth=True).first()
+            if user is None:
+                face_index.remove(matched_id)
+        
+        if user is not None:
             login(request, user)
             return JsonResponse({
                 'success': True,
@@ -153,8 +189,11 @@ def face_login(request):
         else:
             return JsonResponse({
                 'success': False,
-                'message': 'Face verification failed.'
+                'message': 'Face verification failed.' if username else
+                           'Face not recognised. Enter your username and try again.'
             }, status=400)
+    except FacePoolBusy:
+        return _face_pool_busy()
     except Exception as e:
         return JsonResponse({
             'success': False,
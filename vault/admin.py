@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import EncryptedFile, FileAccessLog
+from .models import AccessLogRollup, EncryptedFile, FileAccessLog, UserStorageStats
 
 @admin.register(EncryptedFile)
 class EncryptedFileAdmin(admin.ModelAdmin):
@@ -11,8 +11,21 @@ class EncryptedFileAdmin(admin.ModelAdmin):
 
 @admin.register(FileAccessLog)
 class FileAccessLogAdmin(admin.ModelAdmin):
-    list_display = ('file', 'user', 'access_type', 'timestamp', 'ip_address')
+    list_display = ('file_name', 'owner', 'user', 'access_type', 'timestamp', 'ip_address')
     list_filter = ('access_type', 'timestamp', 'user')
-    search_fields = ('file__original_filename', 'user__username', 'ip_address')
+    search_fields = ('file_name', 'owner__username', 'user__username', 'ip_address')
     readonly_fields = ('timestamp',)
     date_hierarchy = 'timestamp'
+
+@admin.register(AccessLogRollup)
+class AccessLogRollupAdmin(admin.ModelAdmin):
+    list_display = ('owner', 'day', 'access_type', 'count')
+    list_filter = ('access_type', 'day')
+    search_fields = ('owner__username',)
+    date_hierarchy = 'day'
+
+@admin.register(UserStorageStats)
+class UserStorageStatsAdmin(admin.ModelAdmin):
+    list_display = ('user', 'file_count', 'total_bytes', 'activity_count', 'last_activity_at')
+    search_fields = ('user__username',)
+    readonly_fields = ('file_count', 'total_bytes', 'activity_count', 'last_activity_at', 'updated_at')
@@ -0,0 +1,148 @@
+"""Read-only JSON API over a user's file metadata for sync clients.
+
+Listings page with the same keyset cursor as the HTML views and accept
+`fields` to return only some attributes. Responses carry an ETag (and
+Last-Modified for single files), so a client polling with If-None-Match
+gets a 304 from a stats row read and one index seek, without the listing
+query running at all.
+"""
+import hashlib
+from functools import wraps
+from django.conf import settings
+from django.http import JsonResponse
+from django.urls import reverse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_safe
+from .models import EncryptedFile
+from .pagination import paginate_keyset
+from .stats import get_storage_stats
+
+# API field name -> (model column, serializer)
+FIELDS = {
+    'id': ('id', lambda f: f.id),
+    'name': ('original_filename', lambda f: f.original_filename),
+    'type': ('file_type', lambda f: f.file_type),
+    'size': ('file_size', lambda f: f.file_size),
+    'created_at': ('created_at', lambda f: f.created_at.isoformat()),
+    'updated_at': ('updated_at', lambda f: f.updated_at.isoformat()),
+    'has_preview': ('thumbnail_key', lambda f: bool(f.thumbnail_key)),
+    'client_encrypted': ('client_encrypted', lambda f: f.client_encrypted),
+}
+
+
+class InvalidFields(ValueError):
+    pass
+
+
+def api_login_required(view):
+    """Answer 401 JSON instead of redirecting anonymous API calls to the login page."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'success': False, 'message': 'Authentication required.'}, status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def _requested_fields(request) -> list:
+    """Field names from `?fields=a,b`, all fields by default; raises InvalidFields."""
+    raw = request.GET.get('fields')
+    if not raw:
+        return list(FIELDS)
+    names = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = [name for name in names if name not in FIELDS]
+    if unknown or not names:
+        raise InvalidFields(f"Unknown fields: {', '.join(unknown) or raw}")
+    # id is always included so clients can address the file
+    return ['id'] + [name for name in names if name != 'id']
+
+
+def _columns(names) -> list:
+    # created_at and id are the keyset cursor, so they are always loaded
+    return list({'id', 'created_at'} | {FIELDS[name][0] for name in names})
+
+
+def _serialize(encrypted_file, names) -> dict:
+    return {name: FIELDS[name][1](encrypted_file) for name in names}
+
+
+def _page_size(request) -> int:
+    try:
+        limit = int(request.GET.get('limit', settings.VAULT_FILES_PER_PAGE))
+    except ValueError:
+        limit = settings.VAULT_FILES_PER_PAGE
+    return max(1, min(limit, settings.VAULT_API_MAX_PAGE_SIZE))
+
+
+def _etag(*parts) -> str:
+    return hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def collection_etag(request):
+    """Version of the user's whole listing: changes on any upload, delete or file update."""
+    stats = get_storage_stats(request.user)
+    latest = (
+        EncryptedFile.objects.filter(user=request.user)
+        .order_by('-updated_at').values_list('updated_at', flat=True).first()
+    )
+    return _etag(request.user.pk, stats.file_count, stats.total_bytes, latest, request.GET.urlencode())
+
+
+def _file_updated_at(request, file_id):
+    return (
+        EncryptedFile.objects.filter(id=file_id, user=request.user)
+        .values_list('updated_at', flat=True).first()
+    )
+
+
+def file_etag(request, file_id):
+    updated_at = _file_updated_at(request, file_id)
+    return None if updated_at is None else _etag(file_id, updated_at, request.GET.get('fields', ''))
+
+
+@require_safe
+@api_login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=collection_etag)
+def file_collection(request):
+    try:
+        names = _requested_fields(request)
+    except InvalidFields as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+
+    files, next_cursor = paginate_keyset(
+        EncryptedFile.objects.filter(user=request.user).only(*_columns(names)),
+        request.GET.get('cursor'),
+        _page_size(request),
+    )
+
+    next_url = None
+    if next_cursor:
+        query = request.GET.copy()
+        query['cursor'] = next_cursor
+        next_url = f"{reverse('api-file-collection')}?{query.urlencode()}"
+
+    return JsonResponse({
+        'results': [_serialize(f, names) for f in files],
+        'next_cursor': next_cursor,
+        'next': next_url,
+    })
+
+
+@require_safe
+@api_login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=file_etag, last_modified_func=_file_updated_at)
+def file_detail(request, file_id):
+    try:
+        names = _requested_fields(request)
+    except InvalidFields as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+
+    encrypted_file = (
+        EncryptedFile.objects.filter(id=file_id, user=request.user)
+        .only(*_columns(names)).first()
+    )
+    if encrypted_file is None:
+        return JsonResponse({'success': False, 'message': 'File not found.'}, status=404)
+    return JsonResponse(_serialize(encrypted_file, names))
@@ -0,0 +1,167 @@
+"""Async versions of the upload, download and listing views for ASGI servers.
+
+Under ASGI, Django receives the request body without blocking the event loop
+and spools large uploads to disk before the view runs. These views then hand
+the KDF and cipher passes to the crypto pool, run ORM and template work on
+worker threads, and stream downloads through an async iterator, so a slow
+client only costs an open connection rather than a whole worker.
+"""
+import asyncio
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.http import StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, redirect, render
+from django.utils.http import content_disposition_header
+from .audit import log_access
+from .cache import fragment_context
+from .executor import CryptoPoolSaturated, crypto_executor
+from .forms import FileDownloadForm, FileUploadForm
+from .keycache import session_scope
+from .models import EncryptedFile
+from .utils import get_chunk_size, save_encrypted_stream
+from .views import _crypto_busy, _file_listing, _open_verified_stream, _record_upload, _upload_context
+
+# Templates may touch request.user lazily, which must not happen on the event loop
+arender = sync_to_async(render)
+
+
+async def run_crypto(fn, *args):
+    """Await `fn(*args)` on the crypto pool without blocking the event loop."""
+    future = crypto_executor.submit(fn, *args)
+    return await asyncio.wrap_future(future)
+
+
+async def aiter_chunks(chunks):
+    """Drive a blocking chunk iterator from worker threads, one chunk at a time.
+
+    Those threads only wait; pass `crypto_executor.iterate(...)` so the
+    cipher work itself runs on the bounded crypto pool.
+    """
+    next_chunk = sync_to_async(next, thread_sensitive=False)
+    try:
+        while True:
+            chunk = await next_chunk(chunks, None)
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            await sync_to_async(close, thread_sensitive=False)()
+
+
+@login_required
+async def upload_file(request):
+    user = await request.auser()
+    if request.method == 'POST':
+        # Parsing reads the spooled body from disk, so keep it off the loop
+        form = await sync_to_async(lambda: FileUploadForm(request.POST, request.FILES))()
+        if await sync_to_async(form.is_valid)():
+            file = form.cleaned_data['file']
+            password = form.cleaned_data['password']
+
+            try:
+                salt = await sync_to_async(user.get_key_salt)()
+                stored = await run_crypto(
+                    save_encrypted_stream, file.chunks(get_chunk_size()), password, session_scope(request, user),
+                    file.content_type, file, salt
+                )
+
+                await sync_to_async(_record_upload)(request, stored, file.name, file.content_type, file.size)
+
+                messages.success(request, 'File uploaded and encrypted successfully.')
+                return redirect('file-list')
+
+            except CryptoPoolSaturated:
+                return await sync_to_async(_crypto_busy)(request)
+            except Exception as e:
+                print(f"Error uploading file: {str(e)}")
+                import traceback
+                traceback.print_exc()
+                messages.error(request, 'Error uploading file. Please try again.')
+                return redirect('upload-file')
+    else:
+        form = FileUploadForm()
+
+    return await arender(request, 'vault/upload.html', await sync_to_async(_upload_context)(form, user))
+
+
+@login_required
+async def file_list(request):
+    user = await request.auser()
+    try:
+        files, next_cursor, total_files, total_size = await sync_to_async(_file_listing)(
+            user, request.GET.get('cursor')
+        )
+
+        context = {
+            'files': files,
+            'next_cursor': next_cursor,
+            'is_first_page': not request.GET.get('cursor'),
+            'total_size': total_size,
+            'total_files': total_files,
+            'user': user,
+            **await sync_to_async(fragment_context)(user.pk)
+        }
+
+        return await arender(request, 'vault/file_list.html', context)
+
+    except Exception as e:
+        print(f"Error in file_list view: {str(e)}")
+        messages.error(request, 'An error occurred while loading your files. Please try again.')
+        return redirect('dashboard')
+
+
+@login_required
+async def download_file(request, file_id):
+    user = await request.auser()
+    encrypted_file = await aget_object_or_404(EncryptedFile, id=file_id, user=user)
+    action = request.GET.get('action', 'download')  # 'download' or 'view'
+
+    if request.method == 'POST':
+        form = FileDownloadForm(request.POST)
+        if form.is_valid():
+            try:
+                # Check the password and decrypt the first chunk on the crypto pool;
+                # the rest is decrypted on the pool as the response streams
+                try:
+                    decrypted_chunks = await run_crypto(
+                        _open_verified_stream, encrypted_file, form.cleaned_data['password'], session_scope(request, user)
+                    )
+                except FileNotFoundError:
+                    print(f"ERROR: Encrypted data not found for file_id={file_id}")
+                    messages.error(request, 'File data not found. It may have been corrupted.')
+                    return redirect('file-list')
+
+                await sync_to_async(log_access)(request, encrypted_file, action)
+
+                response = StreamingHttpResponse(
+                    aiter_chunks(crypto_executor.iterate(decrypted_chunks)), content_type=encrypted_file.file_type
+                )
+                response['Content-Length'] = str(encrypted_file.file_size)
+
+                response['Content-Disposition'] = content_disposition_header(
+                    action == 'download', encrypted_file.original_filename
+                )
+                return response
+
+            except CryptoPoolSaturated:
+                return await sync_to_async(_crypto_busy)(request)
+            except ValueError as e:
+                print(f"ERROR: Decryption failed - {str(e)}")
+                messages.error(request, 'Invalid password. Please try again.')
+            except Exception as e:
+                print(f"ERROR accessing file: {str(e)}")
+                import traceback
+                traceback.print_exc()
+                messages.error(request, 'An error occurred. Please try again or contact support.')
+                return redirect('file-list')
+    else:
+        form = FileDownloadForm()
+
+    return await arender(request, 'vault/file_access.html', {
+        'form': form,
+        'file': encrypted_file,
+        'action': action
+    })
@@ -0,0 +1,176 @@
+import atexit
+import os
+import queue
+import threading
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+from .models import FileAccessLog
+from .stats import record_activity
+
+
+class AccessLogWriter:
+    """Queue FileAccessLog entries in-process and write them with bulk_create.
+
+    A daemon thread flushes whenever `batch_size` entries are waiting or
+    `flush_interval` seconds have passed, so requests only pay for a queue
+    put. Owners' activity stats are updated in the same transaction. If the
+    queue is full the entry is written synchronously instead of being
+    dropped. Pending entries are flushed at interpreter exit.
+    """
+
+    def __init__(self, batch_size: int = 100, flush_interval: float = 1.0, max_queue: int = 10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stopping = threading.Event()
+        self._wake = threading.Event()
+        self.enqueued = 0
+        self.written = 0
+        self.overflowed = 0
+        self.failed = 0
+        self.flushes = 0
+        self.last_flush_at = None
+
+    def log(self, entry: FileAccessLog) -> None:
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(entry)
+            self.enqueued += 1
+            if self._queue.qsize() >= self.batch_size:
+                self._wake.set()
+        except queue.Full:
+            self.overflowed += 1
+            self._write([entry])
+
+    def flush(self) -> int:
+        """Write everything currently queued and return how many entries were written."""
+        written = 0
+        with self._flush_lock:
+            while True:
+                batch = self._drain(self.batch_size)
+                if not batch:
+                    return written
+                written += self._write(batch)
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=self.flush_interval * 5)
+        self.flush()
+
+    def metrics(self) -> dict:
+        return {
+            'queue_depth': self._queue.qsize(),
+            'queue_capacity': self._queue.maxsize,
+            'enqueued': self.enqueued,
+            'written': self.written,
+            'overflowed': self.overflowed,
+            'failed': self.failed,
+            'flushes': self.flushes,
+            'last_flush_at': self.last_flush_at.isoformat() if self.last_flush_at else None,
+        }
+
+    def _ensure_started(self) -> None:
+        # Re-create the thread in forked workers, where it does not survive
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name='access-log-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            # Woken early by log() once a full batch is waiting
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            close_old_connections()
+            self.flush()
+
+    def _drain(self, limit: int) -> list:
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: list) -> int:
+        try:
+            with transaction.atomic():
+                FileAccessLog.objects.bulk_create(batch)
+                record_activity(batch)
+        except Exception:
+            # One bad entry (e.g. its file was deleted meanwhile) must not sink the batch
+            written = sum(self._write_one(entry) for entry in batch)
+        else:
+            written = len(batch)
+        self.written += written
+        self.flushes += 1
+        self.last_flush_at = timezone.now()
+        return written
+
+    def _write_one(self, entry: FileAccessLog) -> int:
+        for _ in range(2):
+            entry.pk = None
+            try:
+                with transaction.atomic():
+                    entry.save()
+                    record_activity([entry])
+                return 1
+            except IntegrityError:
+                # Keep the entry but drop the reference to a file that no longer exists
+                entry.file = None
+            except Exception as e:
+                print(f"Error writing access log entry: {str(e)}")
+                break
+        self.failed += 1
+        return 0
+
+
+access_log_writer = AccessLogWriter(
+    batch_size=getattr(settings, 'VAULT_ACCESS_LOG_BATCH_SIZE', 100),
+    flush_interval=getattr(settings, 'VAULT_ACCESS_LOG_FLUSH_INTERVAL', 1.0),
+    max_queue=getattr(settings, 'VAULT_ACCESS_LOG_MAX_QUEUE', 10000),
+)
+atexit.register(access_log_writer.stop)
+
+
+def build_access_log(request, encrypted_file, access_type: str) -> FileAccessLog:
+    """Build an unsaved FileAccessLog entry for a request.
+
+    The file's owner, name and type are copied onto the entry, so it stays
+    readable after the file itself is deleted.
+    """
+    return FileAccessLog(
+        # A deleted file has no primary key left to reference
+        file=encrypted_file if encrypted_file.pk else None,
+        user=request.user,
+        owner_id=encrypted_file.user_id,
+        file_name=encrypted_file.original_filename,
+        file_type=encrypted_file.file_type,
+        access_type=access_type,
+        timestamp=timezone.now(),
+        ip_address=request.META.get('REMOTE_ADDR'),
+        user_agent=request.META.get('HTTP_USER_AGENT')
+    )
+
+
+def log_access(request, encrypted_file, access_type: str) -> None:
+    """Record a file access, buffered unless VAULT_ACCESS_LOG_BUFFERED is off."""
+    entry = build_access_log(request, encrypted_file, access_type)
+    if getattr(settings, 'VAULT_ACCESS_LOG_BUFFERED', True):
+        access_log_writer.log(entry)
+    else:
+        with transaction.atomic():
+            entry.save()
+            record_activity([entry])
@@ -0,0 +1,62 @@
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+# Cached per-user values live under a version number; bumping it orphans them all at once
+VERSION_KEY = 'vault:user:{user_id}:version'
+
+
+def user_cache_version(user_id) -> int:
+    """Current cache version for a user's fragments, starting at 1."""
+    key = VERSION_KEY.format(user_id=user_id)
+    version = cache.get(key)
+    if version is None:
+        # add() keeps a concurrently created version instead of resetting it
+        cache.add(key, 1, timeout=None)
+        version = cache.get(key, 1)
+    return version
+
+
+def bump_user_cache_version(user_id) -> None:
+    """Invalidate everything cached for a user, e.g. after an upload or delete."""
+    key = VERSION_KEY.format(user_id=user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # No version stored yet (or it was evicted): start above any old one
+        cache.set(key, user_cache_version(user_id) + 1, timeout=None)
+
+
+def user_cache_key(user_id, name: str, *parts) -> str:
+    """Cache key for a named per-user fragment at the user's current version.
+
+    Extra `parts` (a cursor, a filter) are hashed so keys stay short and safe
+    for any backend.
+    """
+    suffix = hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+    return f"vault:user:{user_id}:v{user_cache_version(user_id)}:{name}:{suffix}"
+
+
+def cached_for_user(user_id, name: str, compute, *parts, timeout=DEFAULT_TIMEOUT):
+    """Return a per-user cached value, calling `compute()` to fill it on a miss.
+
+    Without a shared cache backend nothing is cached, since other workers
+    would not see the version bump that invalidates it.
+    """
+    if not settings.CACHE_IS_SHARED:
+        return compute()
+    key = user_cache_key(user_id, name, *parts)
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, timeout)
+    return value
+
+
+def fragment_context(user_id) -> dict:
+    """Context for `{% cache %}` blocks that are keyed on a user's cache version."""
+    return {
+        'cache_version': user_cache_version(user_id),
+        'fragment_ttl': settings.VAULT_FRAGMENT_CACHE_TTL,
+    }
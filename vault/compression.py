@@ -0,0 +1,122 @@
+import itertools
+import lzma
+import math
+import zlib
+from collections import Counter
+from django.conf import settings
+
+# Codecs recorded in EncryptedFile.compression
+CODEC_NONE = ''
+CODEC_ZLIB = 'zlib'
+CODEC_LZMA = 'lzma'
+CODECS = (CODEC_ZLIB, CODEC_LZMA)
+
+# Types that are already compressed, so a second pass only burns CPU
+INCOMPRESSIBLE_TYPES = (
+    'image/jpeg', 'image/png', 'image/gif', 'image/webp', 'image/avif', 'image/heic',
+    'video/', 'audio/',
+    'application/zip', 'application/gzip', 'application/x-gzip', 'application/x-7z-compressed',
+    'application/x-rar-compressed', 'application/vnd.rar', 'application/x-bzip2', 'application/x-xz',
+    'application/zstd', 'application/pdf',
+    'application/vnd.openxmlformats-officedocument.', 'application/vnd.oasis.opendocument.',
+    'application/epub+zip', 'application/java-archive',
+)
+
+# Plaintext bytes produced per decompression step, so a small chunk cannot expand unbounded
+DECOMPRESS_STEP = 256 * 1024
+
+
+def byte_entropy(sample: bytes) -> float:
+    """Shannon entropy of a byte sample in bits per byte (0 to 8)."""
+    if not sample:
+        return 0.0
+    total = len(sample)
+    return -sum(c / total * math.log2(c / total) for c in Counter(sample).values())
+
+
+def choose_codec(file_type: str, sample: bytes) -> str:
+    """Pick the codec for an upload from its declared type and first bytes."""
+    codec = getattr(settings, 'VAULT_COMPRESSION', CODEC_ZLIB)
+    if codec not in CODECS:
+        return CODEC_NONE
+    file_type = (file_type or '').lower()
+    if file_type.startswith(INCOMPRESSIBLE_TYPES):
+        return CODEC_NONE
+    # Tiny files gain nothing and their entropy estimate is meaningless
+    if len(sample) < getattr(settings, 'VAULT_COMPRESSION_MIN_SIZE', 512):
+        return CODEC_NONE
+    if byte_entropy(sample) > getattr(settings, 'VAULT_COMPRESSION_MAX_ENTROPY', 7.5):
+        return CODEC_NONE
+    return codec
+
+
+def new_compressor(codec: str):
+    level = getattr(settings, 'VAULT_COMPRESSION_LEVEL', 6)
+    if codec == CODEC_ZLIB:
+        return zlib.compressobj(level)
+    if codec == CODEC_LZMA:
+        return lzma.LZMACompressor(preset=level)
+    raise ValueError(f'Unknown compression codec: {codec}')
+
+
+def compress_chunks(chunks, codec: str):
+    """Compress an iterable of byte chunks, yielding output as it becomes available."""
+    compressor = new_compressor(codec)
+    for data in chunks:
+        out = compressor.compress(data)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def compress_upload(chunks, file_type: str) -> tuple:
+    """Sniff the first chunk and return (codec, chunks to encrypt)."""
+    chunks = iter(chunks)
+    first = next(chunks, b'')
+    codec = choose_codec(file_type, first)
+    stream = itertools.chain([first], chunks)
+    if codec:
+        stream = compress_chunks(stream, codec)
+    return codec, stream
+
+
+def decompress_chunks(chunks, codec: str):
+    """Yield the decompressed form of `chunks`, at most DECOMPRESS_STEP bytes at a time.
+
+    Closing this generator closes `chunks` too.
+    """
+    try:
+        if codec == CODEC_ZLIB:
+            decompressor = zlib.decompressobj()
+            for data in chunks:
+                while data:
+                    out = decompressor.decompress(data, DECOMPRESS_STEP)
+                    data = decompressor.unconsumed_tail
+                    if out:
+                        yield out
+            out = decompressor.flush()
+            if not decompressor.eof:
+                raise ValueError('Compressed data is truncated')
+        elif codec == CODEC_LZMA:
+            decompressor = lzma.LZMADecompressor()
+            for data in chunks:
+                out = decompressor.decompress(data, DECOMPRESS_STEP)
+                if out:
+                    yield out
+                while not decompressor.needs_input and not decompressor.eof:
+                    out = decompressor.decompress(b'', DECOMPRESS_STEP)
+                    if out:
+                        yield out
+            if not decompressor.eof:
+                raise ValueError('Compressed data is truncated')
+            out = b''
+        else:
+            raise ValueError(f'Unknown compression codec: {codec}')
+        if out:
+            yield out
+    except (zlib.error, lzma.LZMAError):
+        raise ValueError('Invalid password or corrupted file')
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
@@ -0,0 +1,129 @@
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from django.conf import settings
+from django.db import connections
+
+
+class CryptoPoolSaturated(Exception):
+    """Raised when the crypto executor has no free worker or queue slot."""
+
+
+class CryptoExecutor:
+    """Bounded thread pool for the KDF and cipher passes in vault.utils.
+
+    At most `max_workers` jobs run at once and `max_queue` more may wait.
+    Beyond that, `submit` raises CryptoPoolSaturated straight away so the
+    view can answer 503 instead of tying up the request worker. The
+    `cryptography` primitives release the GIL, so threads run in parallel.
+    """
+
+    def __init__(self, max_workers: int = 4, max_queue: int = 16, stream_batch: int = 4):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.stream_batch = stream_batch
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+        self.active = 0
+        self.pending = 0
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def submit(self, fn, *args, block: bool = False, timeout: float = None, **kwargs):
+        """Schedule `fn(*args, **kwargs)`; with block=True, wait up to `timeout` for a slot."""
+        acquired = self._slots.acquire(timeout=timeout) if block else self._slots.acquire(blocking=False)
+        if not acquired:
+            with self._lock:
+                self.rejected += 1
+            raise CryptoPoolSaturated('Crypto workers are busy')
+        with self._lock:
+            self.pending += 1
+            self.submitted += 1
+        try:
+            # Carry context variables (e.g. the primary database pin) into the worker
+            future = self._get_pool().submit(contextvars.copy_context().run, self._call, fn, args, kwargs)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    def run(self, fn, *args, **kwargs):
+        """Run `fn` on the pool and wait for its result."""
+        return self.submit(fn, *args, **kwargs).result()
+
+    def iterate(self, chunks, batch: int = None):
+        """Drain a blocking chunk iterator on the pool, `batch` chunks per job.
+
+        Streamed responses use this so the cipher work behind each chunk stays
+        within the pool's bound instead of running on the request thread.
+        Each stream holds one batch in memory at a time (`stream_batch`
+        chunks by default). Once a response has started, batches wait for a
+        free slot rather than failing it halfway.
+        """
+        batch = batch or self.stream_batch
+        try:
+            while True:
+                produced = self.run(_take, chunks, batch, block=True)
+                yield from produced
+                if len(produced) < batch:
+                    return
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'queue_capacity': self.max_queue,
+                'active': self.active,
+                'queued': self.pending - self.active,
+                'utilization': round(self.active / self.max_workers, 3),
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'rejected': self.rejected,
+            }
+
+    def _call(self, fn, args, kwargs):
+        with self._lock:
+            self.active += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            # Jobs that touched the ORM opened connections in this pool thread
+            connections.close_all()
+            with self._lock:
+                self.active -= 1
+
+    def _release(self):
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+        self._slots.release()
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        # Forked workers inherit the object but not its threads
+        if self._pool is None or self._pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pid != os.getpid():
+                    self._pid = os.getpid()
+                    self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='vault-crypto')
+        return self._pool
+
+
+def _take(chunks, count: int) -> list:
+    return list(islice(chunks, count))
+
+
+crypto_executor = CryptoExecutor(
+    max_workers=getattr(settings, 'VAULT_CRYPTO_WORKERS', 4),
+    max_queue=getattr(settings, 'VAULT_CRYPTO_QUEUE', 16),
+    stream_batch=getattr(settings, 'VAULT_CRYPTO_STREAM_BATCH', 4),
+)
@@ -1,4 +1,16 @@
+import base64
+import binascii
+import os
+import unicodedata
+from datetime import datetime, time, timedelta
 from django import forms
+from django.conf import settings
+from django.utils import timezone
+from .models import FileAccessLog
+from .search import search_files
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
 
 class FileUploadForm(forms.Form):
     file = forms.FileField(
@@ -14,10 +26,201 @@ class FileUploadForm(forms.Form):
         })
     )
 
+class Base64BytesField(forms.CharField):
+    """Base64 text decoded to bytes of a fixed length."""
+    def __init__(self, length, *args, **kwargs):
+        self.length = length
+        super().__init__(*args, **kwargs)
+
+    def clean(self, value):
+        value = super().clean(value)
+        try:
+            data = base64.b64decode(value, validate=True)
+        except (binascii.Error, ValueError):
+            raise forms.ValidationError('Enter valid base64.')
+        if len(data) != self.length:
+            raise forms.ValidationError(f'Expected {self.length} bytes.')
+        return data
+
+class ClientUploadForm(forms.Form):
+    """A file encrypted in the browser, with the key material needed to decrypt it later."""
+    ciphertext = forms.FileField()
+    filename = forms.CharField(max_length=1024)
+    file_type = forms.CharField(max_length=100, required=False)
+    file_size = forms.IntegerField(min_value=0)
+    salt = Base64BytesField(16)
+    iv = Base64BytesField(7)
+    key_check = Base64BytesField(16)
+    wrapped_key = Base64BytesField(40)
+
+    def clean_filename(self):
+        # Only the base name, as for uploaded files; browsers may send a path
+        name = self.cleaned_data['filename'].replace('\\', '/').rsplit('/', 1)[-1]
+        # Drop quotes and control characters, which could break response headers
+        name = ''.join(c for c in name if c not in '"\'' and unicodedata.category(c)[0] != 'C').strip()
+        if len(name) > 255:
+            root, ext = os.path.splitext(name)
+            name = root[:255 - len(ext)] + ext
+        if not name:
+            raise forms.ValidationError('Enter a file name.')
+        return name
+
+class MultipleFileInput(forms.ClearableFileInput):
+    allow_multiple_selected = True
+
+class MultipleFileField(forms.FileField):
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('widget', MultipleFileInput())
+        super().__init__(*args, **kwargs)
+
+    def clean(self, data, initial=None):
+        single_file_clean = super().clean
+        if isinstance(data, (list, tuple)):
+            return [single_file_clean(d, initial) for d in data]
+        return [single_file_clean(data, initial)]
+
+class BulkUploadForm(forms.Form):
+    files = MultipleFileField(
+        widget=MultipleFileInput(attrs={
+            'class': 'form-control',
+            'accept': '*/*'
+        })
+    )
+    password = forms.CharField(
+        widget=forms.PasswordInput(attrs={
+            'class': 'form-control',
+            'placeholder': 'Enter encryption password for all files'
+        })
+    )
+
+    def clean_files(self):
+        files = self.cleaned_data['files']
+        if not files:
+            raise forms.ValidationError('Select at least one file.')
+        limit = settings.VAULT_BULK_UPLOAD_MAX_FILES
+        if len(files) > limit:
+            raise forms.ValidationError(f'You can upload at most {limit} files at once.')
+        return files
+
 class FileDownloadForm(forms.Form):
     password = forms.CharField(
         widget=forms.PasswordInput(attrs={
             'class': 'form-control',
             'placeholder': 'Enter decryption password'
         })
-    ) 
\ No newline at end of file
+    )
+
+class RekeyForm(forms.Form):
+    old_password = forms.CharField(
+        widget=forms.PasswordInput(attrs={
+            'class': 'form-control',
+            'placeholder': 'Current encryption password'
+        })
+    )
+    new_password = forms.CharField(
+        widget=forms.PasswordInput(attrs={
+            'class': 'form-control',
+            'placeholder': 'New encryption password'
+        })
+    )
+    confirm_password = forms.CharField(
+        widget=forms.PasswordInput(attrs={
+            'class': 'form-control',
+            'placeholder': 'Confirm new password'
+        })
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('new_password') != cleaned_data.get('confirm_password'):
+            raise forms.ValidationError('The new passwords do not match.')
+        return cleaned_data
+
+class AccessLogFilterForm(forms.Form):
+    access_type = forms.ChoiceField(
+        required=False,
+        choices=[('', 'All actions')] + FileAccessLog.ACCESS_TYPE_CHOICES,
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    start = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    end = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+
+    def filter(self, queryset):
+        """Apply the cleaned filters to a FileAccessLog queryset; dates are inclusive."""
+        data = self.cleaned_data
+        if data.get('access_type'):
+            queryset = queryset.filter(access_type=data['access_type'])
+        if data.get('start'):
+            queryset = queryset.filter(timestamp__gte=_day_start(data['start']))
+        if data.get('end'):
+            queryset = queryset.filter(timestamp__lt=_day_start(data['end'] + timedelta(days=1)))
+        return queryset
+
+    def filter_rollups(self, queryset):
+        """Apply the same filters to an AccessLogRollup queryset."""
+        data = self.cleaned_data
+        if data.get('access_type'):
+            queryset = queryset.filter(access_type=data['access_type'])
+        if data.get('start'):
+            queryset = queryset.filter(day__gte=data['start'])
+        if data.get('end'):
+            queryset = queryset.filter(day__lte=data['end'])
+        return queryset
+
+class FileSearchForm(forms.Form):
+    FILE_TYPE_CHOICES = [
+        ('', 'All types'),
+        ('image/', 'Images'),
+        ('video/', 'Videos'),
+        ('audio/', 'Audio'),
+        ('application/pdf', 'PDF'),
+        ('text/', 'Text'),
+    ]
+
+    q = forms.CharField(
+        required=False,
+        max_length=255,
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'File name', 'type': 'search'})
+    )
+    file_type = forms.ChoiceField(
+        required=False,
+        choices=FILE_TYPE_CHOICES,
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    min_size = forms.IntegerField(
+        required=False,
+        min_value=0,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'KB'})
+    )
+    max_size = forms.IntegerField(
+        required=False,
+        min_value=0,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'KB'})
+    )
+    start = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    end = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+
+    def search(self, user):
+        """Return the user's files matching the cleaned filters; sizes are in KB, dates inclusive."""
+        data = self.cleaned_data
+        return search_files(
+            user,
+            name=data.get('q') or '',
+            file_type=data.get('file_type') or '',
+            min_size=data['min_size'] * 1024 if data.get('min_size') is not None else None,
+            max_size=data['max_size'] * 1024 if data.get('max_size') is not None else None,
+            start=_day_start(data['start']) if data.get('start') else None,
+            end=_day_start(data['end'] + timedelta(days=1)) if data.get('end') else None,
+        )
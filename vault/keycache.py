@@ -0,0 +1,84 @@
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+
+
+class DerivedKeyCache:
+    """Bounded in-process cache of PBKDF2-derived keys.
+
+    Entries are keyed by (scope, salt, password fingerprint), where scope is
+    normally the user's session. Passwords are never stored: the fingerprint
+    is an HMAC under a random per-process secret. Entries expire after `ttl`
+    seconds and the least recently used entry is evicted once `max_entries`
+    is reached.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._secret = os.urandom(32)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _fingerprint(self, password: str) -> bytes:
+        return hmac.new(self._secret, password.encode(), hashlib.sha256).digest()
+
+    def get(self, scope: str, salt: bytes, password: str):
+        if not scope or self.max_entries <= 0:
+            return None
+        cache_key = (scope, bytes(salt), self._fingerprint(password))
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                return None
+            key, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[cache_key]
+                return None
+            self._entries.move_to_end(cache_key)
+            return key
+
+    def set(self, scope: str, salt: bytes, password: str, key: bytes) -> None:
+        if not scope or self.max_entries <= 0:
+            return
+        cache_key = (scope, bytes(salt), self._fingerprint(password))
+        with self._lock:
+            self._entries[cache_key] = (key, time.monotonic() + self.ttl)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, scope: str) -> None:
+        """Drop every key cached for a scope, e.g. when its session ends."""
+        with self._lock:
+            for cache_key in [k for k in self._entries if k[0] == scope]:
+                del self._entries[cache_key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+key_cache = DerivedKeyCache(
+    max_entries=getattr(settings, 'VAULT_KEY_CACHE_SIZE', 256),
+    ttl=getattr(settings, 'VAULT_KEY_CACHE_TTL', 300),
+)
+
+
+def session_scope(request, user=None) -> str:
+    """Cache scope for the current login session, or None if there is none.
+
+    Async views should pass the user from ``await request.auser()``.
+    """
+    user = user if user is not None else request.user
+    session_key = request.session.session_key
+    if not session_key or not user.is_authenticated:
+        return None
+    return f"{user.pk}:{session_key}"
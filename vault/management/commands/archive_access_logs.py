@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from vault.models import FileAccessLog
+from vault.retention import archive_access_logs, retention_cutoff
+
+
+class Command(BaseCommand):
+    help = (
+        "Roll access log entries older than the retention period up into daily "
+        "per-user counts, export them to gzipped JSONL segments and delete them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.VAULT_ACCESS_LOG_RETENTION_DAYS,
+                            help='Keep this many days of raw entries (default: VAULT_ACCESS_LOG_RETENTION_DAYS).')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Entries archived and deleted per transaction (default: 5000).')
+        parser.add_argument('--archive-dir', default=settings.VAULT_ACCESS_LOG_ARCHIVE_ROOT,
+                            help='Where segments are written (default: VAULT_ACCESS_LOG_ARCHIVE_ROOT).')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how many entries would be archived.')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1:
+            raise CommandError("--days must be at least 1.")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+
+        cutoff = retention_cutoff(options['days'])
+        if options['dry_run']:
+            count = FileAccessLog.objects.filter(timestamp__lt=cutoff).count()
+            self.stdout.write(f"{count} entries before {cutoff.isoformat()} would be archived.")
+            return
+
+        def progress(count, path):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"Archived {count} entries to {path}")
+
+        totals = archive_access_logs(cutoff, options['archive_dir'], options['batch_size'], progress)
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {totals['archived']} entries before {cutoff.isoformat()} "
+            f"in {totals['segments']} segment(s); {totals['rollups']} daily count(s) updated."
+        ))
@@ -0,0 +1,87 @@
+import os
+import shutil
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from vault.models import EncryptedFile
+from vault.storage import get_blob_store, new_blob_key
+from vault.utils import delete_encrypted_file
+
+
+class Command(BaseCommand):
+    help = (
+        "Move ciphertext held in EncryptedFile.encrypted_data or legacy "
+        "encrypted_path files into the blob store. Safe to interrupt and re-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Rows to fetch per batch (default: 100).')
+        parser.add_argument('--limit', type=int, default=None,
+                            help='Stop after migrating this many rows.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how many rows are pending.')
+
+    def handle(self, *args, **options):
+        pending = EncryptedFile.objects.filter(blob_key='').filter(
+            Q(encrypted_data__isnull=False) | ~Q(encrypted_path='')
+        )
+        self.stdout.write(f"{pending.count()} file(s) pending migration.")
+        if options['dry_run']:
+            return
+
+        store = get_blob_store()
+        migrated = failed = 0
+        last_id = 0
+        limit = options['limit']
+
+        while limit is None or migrated < limit:
+            # Keyset over ids so failed rows are skipped rather than re-fetched forever
+            batch = list(
+                pending.filter(id__gt=last_id).order_by('id')
+                .values_list('id', flat=True)[:options['batch_size']]
+            )
+            if not batch:
+                break
+
+            for file_id in batch:
+                last_id = file_id
+                if limit is not None and migrated >= limit:
+                    break
+                try:
+                    self._migrate_one(store, file_id)
+                    migrated += 1
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"File {file_id}: {e}")
+
+            self.stdout.write(f"Migrated {migrated} file(s), {failed} failed, last id {last_id}.")
+
+        self.stdout.write(self.style.SUCCESS(f"Done: {migrated} migrated, {failed} failed."))
+
+    def _migrate_one(self, store, file_id):
+        # Fetch one row at a time so at most one DB-resident blob is in memory
+        encrypted_file = EncryptedFile.objects.get(id=file_id)
+        blob_key = new_blob_key()
+
+        with store.open_write(blob_key) as out:
+            if encrypted_file.encrypted_data is not None:
+                out.write(encrypted_file.encrypted_data)
+            else:
+                legacy_path = os.path.join(settings.ENCRYPTED_FILES_ROOT, encrypted_file.encrypted_path)
+                with open(legacy_path, 'rb') as source:
+                    shutil.copyfileobj(source, out)
+
+        try:
+            updated = EncryptedFile.objects.filter(id=file_id, blob_key='').update(
+                blob_key=blob_key, encrypted_data=None, encrypted_path=''
+            )
+        except Exception:
+            store.delete(blob_key)
+            raise
+        if not updated:
+            # Migrated concurrently by another run
+            store.delete(blob_key)
+            return
+
+        delete_encrypted_file(encrypted_file.encrypted_path)
@@ -0,0 +1,30 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from vault.stats import rebuild_storage_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute UserStorageStats from the file and access log tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', dest='username',
+                            help='Only rebuild stats for this username.')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        users = User.objects.order_by('pk')
+        if options['username']:
+            users = users.filter(username=options['username'])
+            if not users.exists():
+                raise CommandError(f"User '{options['username']}' does not exist.")
+
+        rebuilt = 0
+        for user_id in users.values_list('pk', flat=True).iterator():
+            with transaction.atomic():
+                stats = rebuild_storage_stats(user_id)
+            rebuilt += 1
+            if options['verbosity'] > 1:
+                self.stdout.write(f"User {user_id}: {stats.file_count} files, {stats.total_bytes} bytes")
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt stats for {rebuilt} user(s)."))
@@ -0,0 +1,28 @@
+import sqlite3
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = "Copy the primary SQLite database onto the SQLite replica, for trying replica routing locally."
+
+    def handle(self, *args, **options):
+        replica = settings.DATABASES.get('replica')
+        primary = settings.DATABASES['default']
+        if replica is None:
+            raise CommandError("No replica configured; set DATABASE_REPLICA_URL.")
+        if 'sqlite3' not in primary['ENGINE'] or 'sqlite3' not in replica['ENGINE']:
+            raise CommandError("sync_replica only copies SQLite to SQLite; use real replication otherwise.")
+
+        connections['replica'].close()
+        # The backup API copies a consistent snapshot even while the primary is in use
+        source = sqlite3.connect(primary['NAME'])
+        target = sqlite3.connect(replica['NAME'])
+        try:
+            with target:
+                source.backup(target)
+        finally:
+            source.close()
+            target.close()
+        self.stdout.write(self.style.SUCCESS(f"Copied {primary['NAME']} to {replica['NAME']}."))
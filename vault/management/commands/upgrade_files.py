@@ -0,0 +1,151 @@
+import getpass
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count, Sum
+from vault.models import EncryptedFile
+from vault.upgrade import upgrade_file
+from vault.utils import FORMAT_LEGACY_CBC
+
+
+class Command(BaseCommand):
+    help = (
+        "Report files per storage format and, with --user, re-encrypt that user's "
+        "legacy CBC files in the current format. Files can only be decrypted with "
+        "their password, which is prompted for; files using a different password "
+        "are skipped. Progress is checkpointed per batch, so runs can be resumed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', dest='username',
+                            help='Upgrade legacy files owned by this username.')
+        parser.add_argument('--batch-size', type=int, default=50,
+                            help='Files per checkpointed batch (default: 50).')
+        parser.add_argument('--workers', type=int, default=2,
+                            help='Files re-encrypted in parallel (default: 2).')
+        parser.add_argument('--max-rate', type=float, default=None,
+                            help='Throttle to this many MB of plaintext per second.')
+        parser.add_argument('--checkpoint', default=None,
+                            help='Checkpoint file (default: under ENCRYPTED_FILES_ROOT).')
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignore the checkpoint, e.g. to retry skipped files with another password.')
+
+    def handle(self, *args, **options):
+        if not options['username']:
+            self._report(EncryptedFile.objects.all())
+            return
+
+        User = get_user_model()
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['username']}' does not exist.")
+        files = EncryptedFile.objects.filter(user=user)
+        self._report(files)
+
+        checkpoint_path = options['checkpoint'] or os.path.join(
+            settings.ENCRYPTED_FILES_ROOT, f'.upgrade-checkpoint-{user.pk}.json'
+        )
+        last_id = 0 if options['restart'] else self._load_checkpoint(checkpoint_path)
+        pending = files.filter(format_version=FORMAT_LEGACY_CBC)
+        if not pending.filter(id__gt=last_id).exists():
+            self.stdout.write("Nothing to upgrade.")
+            return
+
+        password = getpass.getpass(f"Encryption password for {user.username}'s files: ")
+        max_rate = options['max_rate'] * 1024 * 1024 if options['max_rate'] else None
+        workers = max(1, options['workers'])
+        self.upgraded = self.skipped = self.failed = self.processed = 0
+        started = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while True:
+                batch = list(
+                    pending.filter(id__gt=last_id).order_by('id')
+                    .values_list('id', flat=True)[:options['batch_size']]
+                )
+                if not batch:
+                    break
+
+                running = {}
+                for file_id in batch:
+                    if len(running) >= workers:
+                        done, _ = wait(running, return_when=FIRST_COMPLETED)
+                        self._tally(done, running)
+                    if max_rate:
+                        # Sleep until the bytes done so far fit under the rate limit
+                        delay = self.processed / max_rate - (time.monotonic() - started)
+                        if delay > 0:
+                            time.sleep(delay)
+                    running[pool.submit(self._upgrade_one, file_id, password)] = file_id
+                done, _ = wait(running)
+                self._tally(done, running)
+
+                # Every file up to here has been upgraded, skipped or reported
+                last_id = batch[-1]
+                self._save_checkpoint(checkpoint_path, last_id)
+                rate = self.processed / max(time.monotonic() - started, 1e-6) / (1024 * 1024)
+                self.stdout.write(
+                    f"Upgraded {self.upgraded}, skipped {self.skipped}, failed {self.failed}; "
+                    f"last id {last_id}, {rate:.1f} MB/s."
+                )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {self.upgraded} upgraded, {self.skipped} skipped (different password), {self.failed} failed."
+        ))
+        self._report(files)
+
+    def _upgrade_one(self, file_id, password):
+        """Upgrade one file on a worker thread; returns bytes processed, or None if skipped."""
+        try:
+            encrypted_file = EncryptedFile.objects.get(id=file_id)
+            try:
+                return upgrade_file(encrypted_file, password)
+            except ValueError:
+                return None
+        finally:
+            connections.close_all()
+
+    def _tally(self, done, running) -> None:
+        for future in done:
+            file_id = running.pop(future)
+            try:
+                size = future.result()
+            except Exception as e:
+                self.failed += 1
+                self.stderr.write(f"File {file_id}: {e}")
+                continue
+            if size is None:
+                self.skipped += 1
+            else:
+                self.upgraded += 1
+                self.processed += size
+
+    def _report(self, files):
+        rows = files.values('format_version').annotate(count=Count('id'), size=Sum('file_size')).order_by('format_version')
+        labels = {1: 'legacy CBC', 2: 'chunked GCM'}
+        total = sum(row['count'] for row in rows) or 1
+        for row in rows:
+            label = labels.get(row['format_version'], 'unknown')
+            self.stdout.write(
+                f"Format {row['format_version']} ({label}): {row['count']} file(s), "
+                f"{row['size'] or 0} bytes, {row['count'] * 100 / total:.1f}%"
+            )
+
+    def _load_checkpoint(self, path) -> int:
+        try:
+            with open(path) as f:
+                return int(json.load(f).get('last_id', 0))
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _save_checkpoint(self, path, last_id) -> None:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'last_id': last_id}, f)
+        os.replace(tmp_path, path)
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vault', '0002_add_encrypted_data_field'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='encryptedfile',
+            name='format_version',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vault', '0003_encryptedfile_format_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='encryptedfile',
+            name='blob_key',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
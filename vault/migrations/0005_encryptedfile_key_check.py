@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vault', '0004_encryptedfile_blob_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='encryptedfile',
+            name='key_check',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
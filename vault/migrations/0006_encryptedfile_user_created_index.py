@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vault', '0005_encryptedfile_key_check'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='encryptedfile',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='vault_file_user_created_idx'),
+        ),
+    ]
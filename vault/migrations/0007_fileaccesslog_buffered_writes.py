@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:53
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vault', '0006_encryptedfile_user_created_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='fileaccesslog',
+            name='file',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='vault.encryptedfile'),
+        ),
+        migrations.AlterField(
+            model_name='fileaccesslog',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
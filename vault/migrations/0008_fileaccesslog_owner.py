@@ -0,0 +1,64 @@
+# Adds the denormalized owner and file snapshot columns to FileAccessLog
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_owner(apps, schema_editor):
+    FileAccessLog = apps.get_model('vault', 'FileAccessLog')
+    logs = FileAccessLog.objects.select_related('file').defer('file__encrypted_data').order_by('id')
+    batch = []
+    for log in logs.iterator(chunk_size=1000):
+        if log.file is not None:
+            log.owner_id = log.file.user_id
+            log.file_name = log.file.original_filename
+            log.file_type = log.file.file_type
+        else:
+            log.owner_id = log.user_id
+        batch.append(log)
+        if len(batch) >= 1000:
+            FileAccessLog.objects.bulk_update(batch, ['owner', 'file_name', 'file_type'])
+            batch = []
+    if batch:
+        FileAccessLog.objects.bulk_update(batch, ['owner', 'file_name', 'file_type'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('vault', '0007_fileaccesslog_buffered_writes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fileaccesslog',
+            name='owner',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='owned_access_logs', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='fileaccesslog',
+            name='file_name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='fileaccesslog',
+            name='file_type',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.RunPython(backfill_owner, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='fileaccesslog',
+            name='owner',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='owned_access_logs', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='fileaccesslog',
+            index=models.Index(fields=['owner', '-timestamp', '-id'], name='vault_log_owner_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fileaccesslog',
+            index=models.Index(fields=['owner', 'access_type', '-timestamp', '-id'], name='vault_log_owner_type_time_idx'),
+        ),
+    ]
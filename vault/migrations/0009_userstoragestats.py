@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vault', '0008_fileaccesslog_owner'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStorageStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_count', models.PositiveIntegerField(default=0)),
+                ('total_bytes', models.BigIntegerField(default=0)),
+                ('activity_count', models.PositiveIntegerField(default=0)),
+                ('last_activity_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='storage_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'User Storage Stats',
+                'verbose_name_plural': 'User Storage Stats',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vault', '0009_userstoragestats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='encryptedfile',
+            name='compression',
+            field=models.CharField(blank=True, default='', max_length=10),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vault', '0010_encryptedfile_compression'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='encryptedfile',
+            name='wrapped_key',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vault', '0011_encryptedfile_wrapped_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='encryptedfile',
+            name='thumbnail_key',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
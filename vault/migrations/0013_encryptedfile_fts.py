@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    # SQLite only; other databases search with icontains
+    from vault.search import install_fts
+    install_fts(schema_editor.connection)
+
+
+def drop_index(apps, schema_editor):
+    from vault.search import uninstall_fts
+    uninstall_fts(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vault', '0012_encryptedfile_thumbnail_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vault', '0013_encryptedfile_fts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='encryptedfile',
+            index=models.Index(fields=['user', '-updated_at'], name='vault_file_user_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vault', '0014_encryptedfile_user_updated_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccessLogRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('access_type', models.CharField(max_length=20)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='access_log_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Access Log Rollup',
+                'verbose_name_plural': 'Access Log Rollups',
+                'ordering': ['-day'],
+                'constraints': [models.UniqueConstraint(fields=('owner', 'day', 'access_type'), name='vault_rollup_owner_day_type_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vault', '0015_accesslogrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='encryptedfile',
+            name='client_encrypted',
+            field=models.BooleanField(default=False),
+        ),
+    ]
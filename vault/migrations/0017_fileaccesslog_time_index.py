@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vault', '0016_encryptedfile_client_encrypted'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='fileaccesslog',
+            index=models.Index(fields=['timestamp', 'id'], name='vault_log_time_idx'),
+        ),
+    ]
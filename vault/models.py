@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 # Create your models here.
 
@@ -10,14 +11,29 @@ class EncryptedFile(models.Model):
     file_type = models.CharField(max_length=100)
     file_size = models.BigIntegerField()
     encrypted_path = models.CharField(max_length=255, blank=True)  # Keep for backwards compatibility
-    encrypted_data = models.BinaryField(null=True, blank=True)  # Store encrypted file in DB
+    encrypted_data = models.BinaryField(null=True, blank=True)  # Legacy: ciphertext held in DB until migrated
+    blob_key = models.CharField(max_length=64, blank=True)  # Ciphertext location in the blob store
     salt = models.BinaryField()
     iv = models.BinaryField()
+    key_check = models.BinaryField(null=True, blank=True)  # HMAC of the derived key, for cheap password checks
+    wrapped_key = models.BinaryField(null=True, blank=True)  # Per-file data key wrapped by the derived key
+    format_version = models.PositiveSmallIntegerField(default=1)  # 1 = legacy CBC, 2 = chunked GCM
+    compression = models.CharField(max_length=10, blank=True, default='')  # Codec applied before encryption, '' = none
+    thumbnail_key = models.CharField(max_length=64, blank=True)  # Encrypted image preview in the blob store
+    client_encrypted = models.BooleanField(default=False)  # Encrypted in the browser; plaintext never reached the server
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Columns needed to render listings; never includes the ciphertext
+    LISTING_FIELDS = ('id', 'original_filename', 'file_type', 'file_size', 'created_at', 'thumbnail_key')
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='vault_file_user_created_idx'),
+            # Newest change per user, for the API's collection ETag
+            models.Index(fields=['user', '-updated_at'], name='vault_file_user_updated_idx'),
+        ]
         verbose_name = 'Encrypted File'
         verbose_name_plural = 'Encrypted Files'
 
@@ -25,17 +41,67 @@ class EncryptedFile(models.Model):
         return f"{self.original_filename} ({self.user.username})"
 
 class FileAccessLog(models.Model):
-    file = models.ForeignKey(EncryptedFile, on_delete=models.CASCADE)
+    ACCESS_TYPE_CHOICES = [
+        ('upload', 'Upload'),
+        ('download', 'Download'),
+        ('view', 'View'),
+        ('delete', 'Delete'),
+    ]
+
+    file = models.ForeignKey(EncryptedFile, on_delete=models.SET_NULL, null=True, blank=True)  # Kept after the file is deleted
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    access_type = models.CharField(max_length=20)  # 'upload', 'download', 'delete'
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Denormalized from the file so owner listings need no join and survive deletes
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='owned_access_logs')
+    file_name = models.CharField(max_length=255, blank=True)
+    file_type = models.CharField(max_length=100, blank=True)
+    access_type = models.CharField(max_length=20)  # 'upload', 'download', 'view', 'delete'
+    timestamp = models.DateTimeField(default=timezone.now)  # Set when the access happens, not when the buffer is flushed
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.TextField(null=True, blank=True)
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['owner', '-timestamp', '-id'], name='vault_log_owner_time_idx'),
+            models.Index(fields=['owner', 'access_type', '-timestamp', '-id'], name='vault_log_owner_type_time_idx'),
+            models.Index(fields=['timestamp', 'id'], name='vault_log_time_idx'),
+        ]
         verbose_name = 'File Access Log'
         verbose_name_plural = 'File Access Logs'
 
     def __str__(self):
-        return f"{self.access_type} - {self.file.original_filename} by {self.user.username}"
+        return f"{self.access_type} - {self.file_name or 'unknown file'} by {self.user.username}"
+
+class AccessLogRollup(models.Model):
+    """Daily per-owner counts of FileAccessLog entries that were archived and deleted."""
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='access_log_rollups')
+    day = models.DateField()
+    access_type = models.CharField(max_length=20)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'day', 'access_type'], name='vault_rollup_owner_day_type_uniq'),
+        ]
+        verbose_name = 'Access Log Rollup'
+        verbose_name_plural = 'Access Log Rollups'
+
+    def __str__(self):
+        return f"{self.owner.username} {self.day}: {self.count} {self.access_type}"
+
+class UserStorageStats(models.Model):
+    """Per-user totals kept up to date by uploads, deletes and access logging."""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='storage_stats')
+    file_count = models.PositiveIntegerField(default=0)
+    total_bytes = models.BigIntegerField(default=0)
+    activity_count = models.PositiveIntegerField(default=0)
+    last_activity_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'User Storage Stats'
+        verbose_name_plural = 'User Storage Stats'
+
+    def __str__(self):
+        return f"{self.user.username}: {self.file_count} files, {self.total_bytes} bytes"
@@ -0,0 +1,63 @@
+import base64
+import json
+from datetime import datetime
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+# Exclusive upper bound for ids in a cursor (signed 64-bit columns)
+MAX_ID = 2 ** 63
+
+
+def encode_cursor(values) -> str:
+    """Encode the sort-key values of the last row on a page into an opaque cursor."""
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, count: int):
+    """Decode a cursor from `encode_cursor`, returning None if it is missing or malformed.
+
+    Every value but the last must be a timestamp and the last a row id.
+    """
+    if not cursor:
+        return None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(payload, list) or len(payload) != count:
+            return None
+        *timestamps, last_id = payload
+        values = [parse_datetime(v) if isinstance(v, str) else None for v in timestamps]
+    except ValueError:
+        return None
+    if not all(isinstance(v, datetime) for v in values):
+        return None
+    # bool is an int subclass; ids must also fit a 64-bit column
+    if type(last_id) is not int or not 0 <= last_id < MAX_ID:
+        return None
+    return values + [last_id]
+
+
+def paginate_keyset(queryset, cursor: str, page_size: int, key_fields=('created_at', 'id')) -> tuple:
+    """Return one page of `queryset` in descending `key_fields` order and the next cursor.
+
+    Rows are located with a range condition on the key rather than an
+    OFFSET, so every page costs the same index seek no matter how deep it is.
+    The last key field must be unique. Returns (items, next_cursor), where
+    next_cursor is None on the final page.
+    """
+    queryset = queryset.order_by(*[f'-{field}' for field in key_fields])
+    values = decode_cursor(cursor, len(key_fields))
+    if values is not None:
+        condition = Q()
+        for i, field in enumerate(key_fields):
+            step = {prev: values[j] for j, prev in enumerate(key_fields[:i])}
+            step[f'{field}__lt'] = values[i]
+            condition |= Q(**step)
+        queryset = queryset.filter(condition)
+
+    items = list(queryset[:page_size + 1])
+    if len(items) <= page_size:
+        return items, None
+    items = items[:page_size]
+    last = items[-1]
+    return items, encode_cursor([getattr(last, field) for field in key_fields])
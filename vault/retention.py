@@ -0,0 +1,106 @@
+"""Access log retention: roll old entries up, archive them and delete them.
+
+Entries older than the cutoff are handled oldest first, one batch per
+transaction. Each batch is written to a gzipped JSONL segment, added to the
+owners' daily AccessLogRollup counts and then deleted, so FileAccessLog
+only holds recent history. Owners' activity_count in UserStorageStats keeps
+counting archived entries.
+"""
+import gzip
+import json
+import os
+from collections import Counter
+from datetime import datetime, time, timedelta
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+from .models import AccessLogRollup, FileAccessLog
+
+# Columns written to archive segments
+ARCHIVE_FIELDS = (
+    'id', 'file_id', 'user_id', 'owner_id', 'file_name', 'file_type',
+    'access_type', 'timestamp', 'ip_address', 'user_agent',
+)
+
+
+def retention_cutoff(days: int) -> datetime:
+    """Start of the local day `days` days ago; only whole days are archived."""
+    day = timezone.localdate() - timedelta(days=days)
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def write_segment(rows, archive_root: str) -> str:
+    """Write rows (dicts of ARCHIVE_FIELDS) to a gzipped JSONL file and return its path.
+
+    Segments are named after their id range, so re-archiving a batch after a
+    failed run replaces its segment instead of duplicating it.
+    """
+    first = rows[0]
+    directory = os.path.join(archive_root, timezone.localtime(first['timestamp']).strftime('%Y/%m'))
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"access-log-{first['id']}-{rows[-1]['id']}.jsonl.gz")
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as out:
+            for row in rows:
+                row = dict(row, timestamp=row['timestamp'].isoformat())
+                out.write(json.dumps(row, separators=(',', ':')).encode() + b'\n')
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp_path, path)
+    return path
+
+
+def add_to_rollups(rows) -> int:
+    """Add rows to their owners' daily counts; returns how many rollup rows were touched."""
+    counts = Counter(
+        (row['owner_id'], timezone.localtime(row['timestamp']).date(), row['access_type']) for row in rows
+    )
+    for (owner_id, day, access_type), count in counts.items():
+        rollup = AccessLogRollup.objects.filter(owner_id=owner_id, day=day, access_type=access_type)
+        if rollup.update(count=F('count') + count):
+            continue
+        try:
+            # Savepoint: a concurrent run may create the same row first
+            with transaction.atomic():
+                AccessLogRollup.objects.create(owner_id=owner_id, day=day, access_type=access_type, count=count)
+        except IntegrityError:
+            rollup.update(count=F('count') + count)
+    return len(counts)
+
+
+def archive_access_logs(cutoff: datetime, archive_root: str, batch_size: int = 5000, progress=None) -> dict:
+    """Archive and delete every entry older than `cutoff`; returns totals.
+
+    Rows are read inside each batch's transaction, which keeps the reads on
+    the primary database. The segment is on disk before the delete commits.
+    """
+    totals = {'archived': 0, 'segments': 0, 'rollups': 0}
+    while True:
+        with transaction.atomic():
+            rows = list(
+                FileAccessLog.objects.filter(timestamp__lt=cutoff)
+                .order_by('timestamp', 'id').values(*ARCHIVE_FIELDS)[:batch_size]
+            )
+            if not rows:
+                return totals
+            path = write_segment(rows, archive_root)
+            totals['rollups'] += add_to_rollups(rows)
+            FileAccessLog.objects.filter(id__in=[row['id'] for row in rows]).delete()
+
+        totals['archived'] += len(rows)
+        totals['segments'] += 1
+        if progress is not None:
+            progress(len(rows), path)
+
+
+def daily_summary(rollups, limit: int) -> list:
+    """Newest `limit` days of an AccessLogRollup queryset, one dict of counts per day."""
+    counts = {
+        access_type: Sum('count', filter=Q(access_type=access_type))
+        for access_type, _ in FileAccessLog.ACCESS_TYPE_CHOICES
+    }
+    return list(
+        rollups.values('day').annotate(total=Sum('count'), **counts).order_by('-day')[:limit]
+    )
@@ -0,0 +1,119 @@
+"""Filename search backed by an SQLite FTS5 index.
+
+On SQLite, `vault_encryptedfile_fts` is an external-content FTS5 table over
+EncryptedFile.original_filename, kept in step by insert, update and delete
+triggers, so a name search is an index lookup instead of a LIKE scan. Other
+databases (or SQLite builds without FTS5) fall back to `icontains`.
+"""
+import re
+from django.db import connections
+from django.db.models.expressions import RawSQL
+from .models import EncryptedFile
+
+FTS_TABLE = 'vault_encryptedfile_fts'
+
+INSTALL_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        original_filename, content='vault_encryptedfile', content_rowid='id', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON vault_encryptedfile BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, original_filename) VALUES (new.id, new.original_filename);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON vault_encryptedfile BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, original_filename) VALUES ('delete', old.id, old.original_filename);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF original_filename ON vault_encryptedfile BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, original_filename) VALUES ('delete', old.id, old.original_filename);
+        INSERT INTO {FTS_TABLE}(rowid, original_filename) VALUES (new.id, new.original_filename);
+    END""",
+]
+
+UNINSTALL_SQL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+# Aliases already checked for a usable index
+_fts_aliases = {}
+
+
+def install_fts(connection) -> bool:
+    """Create the index and its triggers if missing; returns False where FTS5 is unavailable.
+
+    Safe to run repeatedly. Called after every migrate because SQLite table
+    rebuilds in later migrations drop the triggers.
+    """
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT count(*) FROM sqlite_master WHERE name IN (%s, %s)",
+                       [FTS_TABLE, f'{FTS_TABLE}_ai'])
+        complete = cursor.fetchone()[0] == 2
+        if not complete:
+            try:
+                for statement in INSTALL_SQL:
+                    cursor.execute(statement)
+            except Exception as e:
+                print(f"FTS5 index unavailable, using icontains search: {str(e)}")
+                return False
+            # Index rows that were written while the triggers were missing
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    _fts_aliases.pop(connection.alias, None)
+    return True
+
+
+def uninstall_fts(connection) -> None:
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for statement in UNINSTALL_SQL:
+            cursor.execute(statement)
+    _fts_aliases.pop(connection.alias, None)
+
+
+def has_fts(alias: str) -> bool:
+    if alias not in _fts_aliases:
+        connection = connections[alias]
+        _fts_aliases[alias] = (
+            connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names()
+        )
+    return _fts_aliases[alias]
+
+
+def fts_query(text: str) -> str:
+    """Turn user input into an FTS5 query matching every word as a prefix, or '' if it has none."""
+    words = re.findall(r'\w+', text)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def filter_by_name(queryset, text: str):
+    """Restrict an EncryptedFile queryset to names matching `text`."""
+    text = text.strip()
+    if not text:
+        return queryset
+    match = fts_query(text)
+    if match and has_fts(queryset.db):
+        return queryset.filter(id__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]
+        ))
+    return queryset.filter(original_filename__icontains=text)
+
+
+def search_files(user, name='', file_type='', min_size=None, max_size=None, start=None, end=None):
+    """EncryptedFile queryset for a user's files matching the given filters."""
+    files = EncryptedFile.objects.filter(user=user)
+    files = filter_by_name(files, name)
+    if file_type:
+        # 'image/' matches every image type
+        files = files.filter(file_type__startswith=file_type)
+    if min_size is not None:
+        files = files.filter(file_size__gte=min_size)
+    if max_size is not None:
+        files = files.filter(file_size__lte=max_size)
+    if start is not None:
+        files = files.filter(created_at__gte=start)
+    if end is not None:
+        files = files.filter(created_at__lt=end)
+    return files
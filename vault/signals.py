@@ -0,0 +1,35 @@
+from django.contrib.auth.signals import user_logged_out
+from django.db import connections, router, transaction
+from django.db.models.signals import post_delete, post_migrate
+from django.dispatch import receiver
+from .keycache import key_cache, session_scope
+from .models import EncryptedFile
+from .search import FTS_TABLE, install_fts
+from .utils import delete_ciphertext
+
+
+@receiver(user_logged_out)
+def forget_session_keys(sender, request, user, **kwargs):
+    """Drop cached derived keys for the session that is logging out."""
+    if request is not None and user is not None:
+        scope = session_scope(request)
+        if scope:
+            key_cache.invalidate(scope)
+
+
+@receiver(post_migrate)
+def restore_search_index(sender, using, **kwargs):
+    """Recreate the filename index triggers, which SQLite table rebuilds drop."""
+    if sender.name != 'vault' or not router.allow_migrate(using, 'vault'):
+        return
+    connection = connections[using]
+    # Only where migration 0013 created the index
+    if FTS_TABLE in connection.introspection.table_names():
+        install_fts(connection)
+
+
+@receiver(post_delete, sender=EncryptedFile)
+def delete_stored_ciphertext(sender, instance, using, **kwargs):
+    """Remove a deleted file's blobs, however the row went (view, cascade, admin or queryset)."""
+    # Only once the delete has committed, so a rollback keeps the row readable
+    transaction.on_commit(lambda: delete_ciphertext(instance), using=using)
@@ -0,0 +1,83 @@
+from collections import defaultdict
+from django.db.models import Count, F, Max, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from .models import AccessLogRollup, EncryptedFile, FileAccessLog, UserStorageStats
+
+
+def rebuild_storage_stats(user_id) -> UserStorageStats:
+    """Recompute a user's stats from the file and log tables and save them."""
+    files = EncryptedFile.objects.filter(user_id=user_id).aggregate(
+        file_count=Count('id'), total_bytes=Sum('file_size')
+    )
+    activity = FileAccessLog.objects.filter(owner_id=user_id).aggregate(
+        activity_count=Count('id'), last_activity_at=Max('timestamp')
+    )
+    # Entries moved out of the log table by archive_access_logs still count
+    archived = AccessLogRollup.objects.filter(owner_id=user_id).aggregate(count=Sum('count'))['count'] or 0
+    stats, _ = UserStorageStats.objects.update_or_create(
+        user_id=user_id,
+        defaults={
+            'file_count': files['file_count'],
+            'total_bytes': files['total_bytes'] or 0,
+            'activity_count': activity['activity_count'] + archived,
+            'last_activity_at': activity['last_activity_at'],
+        }
+    )
+    return stats
+
+
+def get_storage_stats(user) -> UserStorageStats:
+    """Return the user's stats row, building it on first use."""
+    try:
+        return UserStorageStats.objects.get(user=user)
+    except UserStorageStats.DoesNotExist:
+        return rebuild_storage_stats(user.pk)
+
+
+def _apply_file_delta(user_id, files: int, size: int) -> None:
+    updated = UserStorageStats.objects.filter(user_id=user_id).update(
+        file_count=F('file_count') + files,
+        total_bytes=F('total_bytes') + size,
+    )
+    if not updated:
+        # No row yet: build it from the tables, which already include this change
+        rebuild_storage_stats(user_id)
+
+
+def record_upload(encrypted_file) -> None:
+    """Count a newly created file; call inside the transaction that created it."""
+    _apply_file_delta(encrypted_file.user_id, 1, encrypted_file.file_size)
+
+
+def record_uploads(encrypted_files) -> None:
+    """Count a batch of newly created files, one update per owner."""
+    per_user = defaultdict(lambda: [0, 0])
+    for encrypted_file in encrypted_files:
+        totals = per_user[encrypted_file.user_id]
+        totals[0] += 1
+        totals[1] += encrypted_file.file_size
+    for user_id, (files, size) in per_user.items():
+        _apply_file_delta(user_id, files, size)
+
+
+def record_delete(encrypted_file) -> None:
+    """Uncount a deleted file; call inside the transaction that deleted it."""
+    _apply_file_delta(encrypted_file.user_id, -1, -encrypted_file.file_size)
+
+
+def record_activity(entries) -> None:
+    """Count written FileAccessLog entries against their owners' stats."""
+    per_owner = defaultdict(lambda: [0, None])
+    for entry in entries:
+        totals = per_owner[entry.owner_id]
+        totals[0] += 1
+        if totals[1] is None or entry.timestamp > totals[1]:
+            totals[1] = entry.timestamp
+
+    for owner_id, (count, last_at) in per_owner.items():
+        updated = UserStorageStats.objects.filter(user_id=owner_id).update(
+            activity_count=F('activity_count') + count,
+            last_activity_at=Greatest(Coalesce('last_activity_at', Value(last_at)), Value(last_at)),
+        )
+        if not updated:
+            rebuild_storage_stats(owner_id)
@@ -0,0 +1,9 @@
+import base64
+from django import template
+
+register = template.Library()
+
+@register.filter(name='b64encode')
+def b64encode(value):
+    """Base64-encode binary field data for use in page attributes."""
+    return base64.b64encode(bytes(value or b'')).decode('ascii')
@@ -1,3 +1,905 @@
-from django.test import TestCase
+import base64
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db.models import QuerySet
+from django.conf import settings
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from secure_vault.routers import PIN_COOKIE, PrimaryReplicaRouter, ReplicaPinningMiddleware, use_primary
+from .audit import AccessLogWriter
+from .compression import DECOMPRESS_STEP, choose_codec, compress_chunks, decompress_chunks
+from .executor import CryptoExecutor, CryptoPoolSaturated, crypto_executor
+from .keycache import key_cache
+from .models import AccessLogRollup, EncryptedFile, FileAccessLog
+from .pagination import decode_cursor, encode_cursor, paginate_keyset
+from .retention import add_to_rollups, archive_access_logs, daily_summary, retention_cutoff
+from .search import has_fts, search_files
+from .stats import get_storage_stats, rebuild_storage_stats, record_delete, record_upload, record_uploads
+from .storage import FileSystemBlobStore, get_blob_store
+from .thumbnails import make_thumbnail
+from .upgrade import upgrade_file
+from .views import _open_verified_stream, _read_verified_thumbnail, _save_rekeyed
+from .utils import (
+    FORMAT_CHUNKED_GCM, STREAM_HEADER, TAG_SIZE, StreamEncryptor, compute_key_check, decrypt_legacy_stream,
+    decrypt_stream, decrypt_stream_with_key, encrypt_file, encrypt_stream, encrypt_stream_with_key, generate_key,
+    iter_decrypted_file, rekey_files, save_client_ciphertext, save_encrypted_stream, unwrap_data_key,
+    verify_key, verify_password, wrap_data_key,
+)
 
-# Create your tests here.
+# Known-answer vector for the chunked GCM format. static/js/vault-crypto.js
+# must produce the same bytes from encryptFile() when its random nonce
+# prefix and data key are pinned to these values.
+KAT_PASSWORD = 'correct horse battery staple'
+KAT_SALT = bytes(range(16))
+KAT_NONCE_PREFIX = bytes(range(16, 23))
+KAT_DATA_KEY = bytes(range(32, 64))
+KAT_PLAINTEXT = b'Secure vault known-answer test'
+KAT_CHUNK_SIZE = 16
+KAT_CIPHERTEXT = bytes.fromhex(
+    '53564c540200000010000102030405060708090a0b0c0d0e0f10111213141516'
+    'b0138d855fbd0aeb56493724079a470fa5a8ab4563aef8392c1e4292a3df7d7b'
+    '29518b9b374b5139f50f42fad9491d46ce503364a4efcc9e6e4cbfa9784c'
+)
+KAT_KEY_CHECK = bytes.fromhex('7a134c6c637aaa964ee0abd598ca86eb')
+KAT_WRAPPED_KEY = bytes.fromhex('238a3a86c525acdd59d4fc636b07cba8157569f4e15ef4cc35fcdd6af804c66cbec76b6127bcfaa1')
+
+
+class VaultTestCase(TestCase):
+    """Runs against empty caches and a throwaway blob store."""
+
+    def setUp(self):
+        cache.clear()
+        key_cache.clear()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        settings_override = override_settings(
+            ENCRYPTED_FILES_ROOT=self.root,
+            VAULT_BLOB_STORE={'BACKEND': 'vault.storage.FileSystemBlobStore', 'OPTIONS': {'root': self.root}},
+            # Write access log entries in the request, inside the test transaction
+            VAULT_ACCESS_LOG_BUFFERED=False,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        get_blob_store.cache_clear()
+        self.addCleanup(get_blob_store.cache_clear)
+        self.user = get_user_model().objects.create_user(username='alice', password='pw')
+
+    def stored_file(self, plaintext: bytes, password: str, name: str = 'notes.txt', file_type: str = 'text/plain',
+                    thumbnail_source=None) -> EncryptedFile:
+        """A chunked GCM file written to the blob store the way uploads are."""
+        stored = save_encrypted_stream([plaintext], password, file_type=file_type,
+                                       thumbnail_source=thumbnail_source, salt=self.user.get_key_salt())
+        return EncryptedFile.objects.create(
+            user=self.user, filename=name, original_filename=name, file_type=file_type,
+            file_size=len(plaintext), **stored
+        )
+
+    def file_row(self, name: str, file_type: str = 'text/plain', file_size: int = 0) -> EncryptedFile:
+        """A metadata-only row, for listing and search tests that never read contents."""
+        return EncryptedFile.objects.create(
+            user=self.user, filename=name, original_filename=name, file_type=file_type, file_size=file_size,
+            salt=b'', iv=b'',
+        )
+
+    def log_entry(self, access_type: str, timestamp, owner=None) -> FileAccessLog:
+        owner = owner or self.user
+        return FileAccessLog.objects.create(
+            user=owner, owner=owner, file_name='notes.txt', file_type='text/plain', access_type=access_type,
+            timestamp=timestamp,
+        )
+
+    def legacy_file(self, plaintext: bytes, password: str) -> EncryptedFile:
+        """A legacy AES-CBC row with its ciphertext still in the database."""
+        encrypted_data, salt, iv = encrypt_file(plaintext, password)
+        return EncryptedFile.objects.create(
+            user=self.user, filename='legacy.txt', original_filename='legacy.txt', file_type='text/plain',
+            file_size=len(plaintext), encrypted_data=encrypted_data, salt=salt, iv=iv,
+        )
+
+
+class StreamFormatTests(TestCase):
+    """Chunked AES-256-GCM format from vault.utils, without touching storage."""
+
+    def setUp(self):
+        cache.clear()
+        key_cache.clear()
+        self.key = bytes(range(32))
+        self.salt = bytes(16)
+
+    def encrypt(self, plaintext: bytes, chunk_size: int = 16) -> bytes:
+        out = io.BytesIO()
+        encrypt_stream_with_key([plaintext[i:i + 5] for i in range(0, len(plaintext), 5)],
+                                self.key, self.salt, out, chunk_size)
+        return out.getvalue()
+
+    def decrypt(self, ciphertext: bytes) -> bytes:
+        return b''.join(decrypt_stream_with_key(io.BytesIO(ciphertext), self.key))
+
+    def test_round_trip(self):
+        for size in (0, 1, 15, 16, 17, 48, 100):
+            plaintext = bytes(i % 251 for i in range(size))
+            with self.subTest(size=size):
+                self.assertEqual(self.decrypt(self.encrypt(plaintext)), plaintext)
+
+    def test_round_trip_with_password(self):
+        out = io.BytesIO()
+        salt, _, key_check = encrypt_stream([b'hello ', b'world'], 'secret', out, chunk_size=4)
+        out.seek(0)
+        self.assertEqual(b''.join(decrypt_stream(out, 'secret')), b'hello world')
+        self.assertEqual(key_check, compute_key_check(generate_key('secret', salt)[0]))
+
+    def test_wrong_password(self):
+        out = io.BytesIO()
+        encrypt_stream([b'hello world'], 'secret', out, chunk_size=4)
+        out.seek(0)
+        with self.assertRaises(ValueError):
+            b''.join(decrypt_stream(out, 'not the secret'))
+
+    def test_tampered_chunk(self):
+        ciphertext = bytearray(self.encrypt(b'x' * 40))
+        ciphertext[STREAM_HEADER.size + 3] ^= 1
+        with self.assertRaises(ValueError):
+            self.decrypt(bytes(ciphertext))
+
+    def test_tampered_header(self):
+        ciphertext = bytearray(self.encrypt(b'x' * 40))
+        ciphertext[10] ^= 1  # salt is authenticated as part of the header
+        with self.assertRaises(ValueError):
+            self.decrypt(bytes(ciphertext))
+
+    def test_truncated_at_chunk_boundary(self):
+        ciphertext = self.encrypt(b'x' * 40)
+        # Drop the final chunk: the new last chunk was not sealed as last
+        with self.assertRaises(ValueError):
+            self.decrypt(ciphertext[:STREAM_HEADER.size + 2 * (16 + TAG_SIZE)])
+
+    def test_truncated_header(self):
+        with self.assertRaises(ValueError):
+            self.decrypt(self.encrypt(b'x')[:STREAM_HEADER.size - 1])
+
+    def test_writer_holds_back_full_chunk(self):
+        out = io.BytesIO()
+        encryptor = StreamEncryptor(self.key, self.salt, out, 16)
+        encryptor.write(b'y' * 16)
+        self.assertEqual(len(out.getvalue()), STREAM_HEADER.size)
+        encryptor.finish()
+        self.assertEqual(len(out.getvalue()), STREAM_HEADER.size + 16 + TAG_SIZE)
+
+    def test_legacy_cbc_still_readable(self):
+        encrypted_data, salt, iv = encrypt_file(b'legacy contents', 'secret')
+        self.assertEqual(b''.join(decrypt_legacy_stream(encrypted_data, 'secret', salt, iv)), b'legacy contents')
+
+
+class KnownAnswerTests(TestCase):
+    """Fixed vector shared with the browser implementation."""
+
+    def setUp(self):
+        cache.clear()
+        key_cache.clear()
+
+    def test_ciphertext(self):
+        out = io.BytesIO()
+        with mock.patch('vault.utils.os.urandom', return_value=KAT_NONCE_PREFIX):
+            encrypt_stream_with_key([KAT_PLAINTEXT], KAT_DATA_KEY, KAT_SALT, out, KAT_CHUNK_SIZE)
+        self.assertEqual(out.getvalue(), KAT_CIPHERTEXT)
+        self.assertEqual(b''.join(decrypt_stream_with_key(io.BytesIO(KAT_CIPHERTEXT), KAT_DATA_KEY)), KAT_PLAINTEXT)
+
+    def test_key_material(self):
+        key, _ = generate_key(KAT_PASSWORD, KAT_SALT)
+        self.assertEqual(compute_key_check(key), KAT_KEY_CHECK)
+        self.assertEqual(wrap_data_key(key, KAT_DATA_KEY), KAT_WRAPPED_KEY)
+        self.assertEqual(unwrap_data_key(key, KAT_WRAPPED_KEY), KAT_DATA_KEY)
+
+
+class VerifyPasswordTests(TestCase):
+    """Password checks against the stored key check; no ciphertext is read."""
+
+    def setUp(self):
+        cache.clear()
+        key_cache.clear()
+        key, _ = generate_key(KAT_PASSWORD, KAT_SALT)
+        self.encrypted_file = EncryptedFile(
+            salt=KAT_SALT, key_check=compute_key_check(key), wrapped_key=KAT_WRAPPED_KEY,
+            format_version=FORMAT_CHUNKED_GCM,
+        )
+
+    def test_correct_password(self):
+        self.assertTrue(verify_password(self.encrypted_file, KAT_PASSWORD))
+
+    def test_wrong_password(self):
+        self.assertFalse(verify_password(self.encrypted_file, 'correct horse battery stapler'))
+
+
+class UpgradeTests(VaultTestCase):
+    def test_upgrade_after_rekey(self):
+        encrypted_file = self.legacy_file(b'ten bytes!', 'old')
+        self.assertTrue(verify_password(encrypted_file, 'old'))
+
+        rekeyed, skipped = rekey_files([encrypted_file], 'old', 'new', self.user.get_key_salt())
+        self.assertEqual((len(rekeyed), skipped), (1, []))
+        encrypted_file.save()
+
+        self.assertEqual(upgrade_file(encrypted_file, 'new'), 10)
+        encrypted_file.refresh_from_db()
+        self.assertEqual(encrypted_file.format_version, FORMAT_CHUNKED_GCM)
+        self.assertEqual(b''.join(iter_decrypted_file(encrypted_file, 'new')), b'ten bytes!')
+
+    def test_download_upgrades_in_place(self):
+        plaintext = b'legacy line\n' * 5000
+        encrypted_file = self.legacy_file(plaintext, 'pw')
+        self.assertEqual(b''.join(_open_verified_stream(encrypted_file, 'pw', None)), plaintext)
+        encrypted_file.refresh_from_db()
+        self.assertEqual(encrypted_file.format_version, FORMAT_CHUNKED_GCM)
+        self.assertIsNone(encrypted_file.encrypted_data)
+        self.assertTrue(get_blob_store().exists(encrypted_file.blob_key))
+        self.assertEqual(b''.join(iter_decrypted_file(encrypted_file, 'pw')), plaintext)
+
+    def test_abandoned_download_is_not_upgraded(self):
+        encrypted_file = self.legacy_file(b'legacy line\n' * 50000, 'pw')
+        with override_settings(VAULT_CHUNK_SIZE=4096):
+            chunks = _open_verified_stream(encrypted_file, 'pw', None)
+            next(chunks)
+            chunks.close()
+        encrypted_file.refresh_from_db()
+        self.assertEqual(encrypted_file.format_version, 1)
+
+    def test_short_padding_is_streamed_but_not_upgraded(self):
+        # 14 bytes leave 2 bytes of padding, below VAULT_UPGRADE_MIN_PADDING
+        encrypted_file = self.legacy_file(b'fourteen bytes', 'pw')
+        self.assertEqual(b''.join(_open_verified_stream(encrypted_file, 'pw', None)), b'fourteen bytes')
+        encrypted_file.refresh_from_db()
+        self.assertEqual(encrypted_file.format_version, 1)
+
+    def test_wrong_password_is_not_upgraded(self):
+        encrypted_file = self.legacy_file(b'ten bytes!', 'old')
+        self.assertIsNone(upgrade_file(encrypted_file, 'other'))
+        encrypted_file.refresh_from_db()
+        self.assertEqual(encrypted_file.format_version, 1)
+
+
+class CiphertextCleanupTests(VaultTestCase):
+    def test_queryset_delete_removes_blob(self):
+        encrypted_file = self.stored_file(b'contents', 'pw')
+        store = get_blob_store()
+        with self.captureOnCommitCallbacks(execute=True):
+            EncryptedFile.objects.filter(pk=encrypted_file.pk).delete()
+        self.assertFalse(store.exists(encrypted_file.blob_key))
+
+    def test_cascade_delete_removes_blob(self):
+        encrypted_file = self.stored_file(b'contents', 'pw')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        self.assertFalse(get_blob_store().exists(encrypted_file.blob_key))
+
+    def test_rolled_back_delete_keeps_blob(self):
+        encrypted_file = self.stored_file(b'contents', 'pw')
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            encrypted_file.delete()
+        self.assertEqual(len(callbacks), 1)
+        self.assertTrue(get_blob_store().exists(encrypted_file.blob_key))
+
+
+def raw_cursor(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+class KeysetPaginationTests(VaultTestCase):
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+        for i in range(5):
+            self.file_row(f'{i}.txt', file_size=i)
+        # Two rows share a timestamp, so the id has to break the tie
+        for i, encrypted_file in enumerate(EncryptedFile.objects.order_by('id')):
+            EncryptedFile.objects.filter(pk=encrypted_file.pk).update(created_at=now - timedelta(minutes=min(i, 3)))
+
+    def test_pages_cover_every_row_once(self):
+        seen, cursor = [], None
+        while True:
+            page, cursor = paginate_keyset(EncryptedFile.objects.all(), cursor, 2)
+            seen += [f.id for f in page]
+            if cursor is None:
+                break
+        expected = list(EncryptedFile.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_cursor_round_trip(self):
+        now = timezone.now()
+        self.assertEqual(decode_cursor(encode_cursor([now, 7]), 2), [now, 7])
+
+    def test_malformed_cursors(self):
+        now = timezone.now().isoformat()
+        for cursor in ('', 'not base64!', raw_cursor({'a': 1}), raw_cursor([now]), raw_cursor([1, 2]),
+                       raw_cursor([now, 'x']), raw_cursor([now, True]), raw_cursor([now, 2 ** 70]),
+                       raw_cursor(['yesterday', 2]), raw_cursor([now, -1])):
+            with self.subTest(cursor=cursor):
+                self.assertIsNone(decode_cursor(cursor, 2))
+
+    def test_malformed_cursor_views(self):
+        self.client.force_login(self.user)
+        cursor = raw_cursor([1, 2])
+        for url in ('/vault/files/', '/vault/files/search/', '/vault/logs/', '/vault/api/files/'):
+            with self.subTest(url=url):
+                response = self.client.get(url, {'cursor': cursor, 'q': 'txt'})
+                self.assertEqual(response.status_code, 200)
+
+
+class KeyDerivationCountTests(VaultTestCase):
+    """Downloads and previews derive the password key once, even without the key cache."""
+
+    def count_derivations(self, fn, *args):
+        with mock.patch('vault.views.generate_key', side_effect=generate_key) as views_kdf, \
+                mock.patch('vault.utils.generate_key', side_effect=generate_key) as utils_kdf, \
+                mock.patch('vault.upgrade.generate_key', side_effect=generate_key) as upgrade_kdf:
+            result = fn(*args)
+        return result, views_kdf.call_count + utils_kdf.call_count + upgrade_kdf.call_count
+
+    def test_download(self):
+        encrypted_file = self.stored_file(b'contents', 'pw')
+        chunks, derivations = self.count_derivations(_open_verified_stream, encrypted_file, 'pw', None)
+        self.assertEqual(b''.join(chunks), b'contents')
+        self.assertEqual(derivations, 1)
+
+    def test_legacy_download(self):
+        encrypted_file = self.legacy_file(b'ten bytes!', 'pw')
+        chunks, derivations = self.count_derivations(_open_verified_stream, encrypted_file, 'pw', None)
+        self.assertEqual(b''.join(chunks), b'ten bytes!')
+        self.assertEqual(derivations, 1)
+
+    def test_wrong_password(self):
+        encrypted_file = self.stored_file(b'contents', 'pw')
+        with self.assertRaises(ValueError):
+            _read_verified_thumbnail(encrypted_file, 'not pw', None)
+
+    def test_key_check_backfill_closes_source(self):
+        encrypted_file = self.stored_file(b'contents', 'pw')
+        EncryptedFile.objects.filter(pk=encrypted_file.pk).update(key_check=None)
+        encrypted_file.refresh_from_db()
+        opened = []
+        open_read = FileSystemBlobStore.open_read
+
+        def tracking_open_read(store, key):
+            opened.append(open_read(store, key))
+            return opened[-1]
+
+        with mock.patch.object(FileSystemBlobStore, 'open_read', tracking_open_read):
+            self.assertTrue(verify_key(encrypted_file, generate_key('pw', bytes(encrypted_file.salt))[0]))
+        self.assertEqual(len(opened), 1)
+        self.assertTrue(opened[0].closed)
+
+
+class CryptoExecutorTests(TestCase):
+    def test_rejects_when_full(self):
+        executor = CryptoExecutor(max_workers=1, max_queue=0)
+        release = threading.Event()
+        future = executor.submit(release.wait)
+        with self.assertRaises(CryptoPoolSaturated):
+            executor.submit(len, b'')
+        release.set()
+        future.result()
+        self.assertEqual(executor.metrics()['rejected'], 1)
+        self.assertEqual(executor.run(len, b'abc'), 3)
+
+    def test_iterate_in_batches(self):
+        executor = CryptoExecutor(max_workers=1, max_queue=0, stream_batch=4)
+        self.assertEqual(list(executor.iterate(iter(range(10)))), list(range(10)))
+        self.assertEqual(executor.metrics()['submitted'], 3)
+
+
+class DownloadTests(VaultTestCase):
+    def test_download_streams_plaintext(self):
+        plaintext = os.urandom(50000)
+        with override_settings(VAULT_CHUNK_SIZE=4096):
+            encrypted_file = self.stored_file(plaintext, 'pw', name='data.bin', file_type='application/octet-stream')
+        self.client.force_login(self.user)
+        response = self.client.post(f'/vault/download/{encrypted_file.id}/', {'password': 'pw'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Length'], str(len(plaintext)))
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="data.bin"')
+        self.assertEqual(b''.join(response.streaming_content), plaintext)
+
+    def test_wrong_password_does_not_stream(self):
+        encrypted_file = self.stored_file(b'contents', 'pw')
+        self.client.force_login(self.user)
+        response = self.client.post(f'/vault/download/{encrypted_file.id}/', {'password': 'not pw'})
+        self.assertFalse(response.streaming)
+        self.assertEqual(response.status_code, 200)
+
+
+class CryptoBusyTests(VaultTestCase):
+    def test_download_answers_503_with_retry_after(self):
+        encrypted_file = self.stored_file(b'contents', 'pw')
+        self.client.force_login(self.user)
+        with mock.patch.object(crypto_executor, 'submit', side_effect=CryptoPoolSaturated('busy')), \
+                override_settings(VAULT_CRYPTO_RETRY_AFTER=7):
+            response = self.client.post(f'/vault/download/{encrypted_file.id}/', {'password': 'pw'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '7')
+
+    def test_uploads_answer_503_without_storing(self):
+        self.client.force_login(self.user)
+        upload = SimpleUploadedFile('a.txt', b'contents', 'text/plain')
+        with mock.patch.object(crypto_executor, 'submit', side_effect=CryptoPoolSaturated('busy')):
+            response = self.client.post('/vault/upload/', {'file': upload, 'password': 'pw'})
+            self.assertEqual(response.status_code, 503)
+            self.assertIn('Retry-After', response)
+
+            upload.seek(0)
+            response = self.client.post(
+                '/vault/upload/bulk/', {'files': [upload], 'password': 'pw'}, headers={'Accept': 'application/json'}
+            )
+            self.assertEqual(response.status_code, 503)
+            self.assertIn('Retry-After', response)
+            self.assertFalse(response.json()['success'])
+        self.assertFalse(EncryptedFile.objects.exists())
+
+
+class FileSearchTests(VaultTestCase):
+    def setUp(self):
+        super().setUp()
+        self.report = self.file_row('Quarterly report.pdf', 'application/pdf', 2048)
+        self.file_row('holiday photo.jpg', 'image/jpeg', 4096)
+        self.file_row('report notes.txt')
+
+    def names(self, **filters):
+        return sorted(search_files(self.user, **filters).values_list('original_filename', flat=True))
+
+    def test_index_is_installed(self):
+        self.assertTrue(has_fts('default'))
+
+    def test_prefix_match(self):
+        self.assertEqual(self.names(name='rep'), ['Quarterly report.pdf', 'report notes.txt'])
+        self.assertEqual(self.names(name='quarterly rep'), ['Quarterly report.pdf'])
+
+    def test_triggers_follow_renames_and_deletes(self):
+        self.report.original_filename = 'Annual summary.pdf'
+        self.report.save()
+        self.assertEqual(self.names(name='summary'), ['Annual summary.pdf'])
+        self.assertEqual(self.names(name='quarterly'), [])
+        self.report.delete()
+        self.assertEqual(self.names(name='summary'), [])
+
+    def test_filters(self):
+        self.assertEqual(self.names(file_type='image/'), ['holiday photo.jpg'])
+        self.assertEqual(self.names(name='report', min_size=1), ['Quarterly report.pdf'])
+
+    def test_pages_keep_the_query(self):
+        self.client.force_login(self.user)
+        with override_settings(VAULT_FILES_PER_PAGE=1):
+            response = self.client.get('/vault/files/search/', {'q': 'report'})
+            self.assertEqual(len(response.context['files']), 1)
+            self.assertEqual(response.context['first_query'], 'q=report')
+            self.assertIn('q=report&cursor=', response.context['next_query'])
+            response = self.client.get(f"/vault/files/search/?{response.context['next_query']}")
+        self.assertEqual(len(response.context['files']), 1)
+        self.assertIsNone(response.context['next_query'])
+        self.assertFalse(response.context['is_first_page'])
+
+
+class RekeyTests(VaultTestCase):
+    def test_rekey_with_one_derivation_per_password(self):
+        files = [self.stored_file(b'first', 'old'), self.stored_file(b'second', 'old'),
+                 self.stored_file(b'third', 'other')]
+        blob_keys = [f.blob_key for f in files]
+        key_cache.clear()
+        with mock.patch('vault.utils.generate_key', side_effect=generate_key) as kdf:
+            rekeyed, skipped = rekey_files(files, 'old', 'new', self.user.get_key_salt())
+        self.assertEqual(kdf.call_count, 2)
+        self.assertEqual((len(rekeyed), skipped), (2, [files[2]]))
+        self.assertEqual(_save_rekeyed(rekeyed), [])
+
+        for encrypted_file, blob_key in zip(files[:2], blob_keys):
+            encrypted_file.refresh_from_db()
+            self.assertEqual(encrypted_file.blob_key, blob_key)
+            self.assertFalse(verify_password(encrypted_file, 'old'))
+        self.assertEqual(b''.join(iter_decrypted_file(files[0], 'new')), b'first')
+        files[2].refresh_from_db()
+        self.assertTrue(verify_password(files[2], 'other'))
+
+    def test_save_skips_files_whose_blob_changed(self):
+        encrypted_file = self.stored_file(b'first', 'old')
+        rekeyed, _ = rekey_files([encrypted_file], 'old', 'new', self.user.get_key_salt())
+        EncryptedFile.objects.filter(pk=encrypted_file.pk).update(blob_key='0' * 32)
+        self.assertEqual(_save_rekeyed(rekeyed), rekeyed)
+        self.assertTrue(verify_password(EncryptedFile.objects.get(pk=encrypted_file.pk), 'old'))
+
+
+class AccessLogViewTests(VaultTestCase):
+    def setUp(self):
+        super().setUp()
+        self.today = timezone.localtime().replace(hour=12, minute=0, second=0, microsecond=0)
+        for days_ago in range(5):
+            self.log_entry('download', self.today - timedelta(days=days_ago))
+            self.log_entry('view', self.today - timedelta(days=days_ago))
+        other = get_user_model().objects.create_user(username='bob', password='pw')
+        self.log_entry('download', self.today, owner=other)
+        self.client.force_login(self.user)
+
+    def walk(self, **filters):
+        """Timestamps of every entry across all pages, newest first."""
+        seen = []
+        with override_settings(VAULT_LOGS_PER_PAGE=2):
+            response = self.client.get('/vault/logs/', filters)
+            while True:
+                self.assertEqual(response.status_code, 200)
+                seen += [(log.access_type, log.timestamp) for log in response.context['logs']]
+                if not response.context['next_query']:
+                    return seen
+                response = self.client.get(f"/vault/logs/?{response.context['next_query']}")
+
+    def test_pages_hold_only_the_owners_entries(self):
+        seen = self.walk()
+        self.assertEqual(len(seen), 10)
+        self.assertEqual([t for _, t in seen], sorted((t for _, t in seen), reverse=True))
+
+    def test_type_and_date_filters(self):
+        start = (self.today - timedelta(days=3)).date()
+        end = (self.today - timedelta(days=1)).date()
+        seen = self.walk(access_type='download', start=start.isoformat(), end=end.isoformat())
+        self.assertEqual([a for a, _ in seen], ['download'] * 3)
+        self.assertEqual([timezone.localdate(t) for _, t in seen], [end, end - timedelta(days=1), start])
+
+
+class StorageStatsTests(VaultTestCase):
+    def assertStatsMatchTables(self):
+        stats = get_storage_stats(self.user)
+        rebuilt = rebuild_storage_stats(self.user.pk)
+        self.assertEqual(
+            (stats.file_count, stats.total_bytes, stats.activity_count),
+            (rebuilt.file_count, rebuilt.total_bytes, rebuilt.activity_count),
+        )
+        return rebuilt
+
+    def test_uploads_and_deletes_keep_totals(self):
+        self.assertEqual(get_storage_stats(self.user).file_count, 0)
+        first = self.file_row('a.txt', file_size=100)
+        record_upload(first)
+        record_uploads([self.file_row('b.txt', file_size=20), self.file_row('c.txt', file_size=3)])
+        self.assertEqual(self.assertStatsMatchTables().total_bytes, 123)
+        first.delete()
+        record_delete(first)
+        stats = self.assertStatsMatchTables()
+        self.assertEqual((stats.file_count, stats.total_bytes), (2, 23))
+
+
+class AccessLogWriterTests(VaultTestCase):
+    def writer(self, **options):
+        # A long interval keeps the background thread idle; the test flushes itself
+        writer = AccessLogWriter(flush_interval=60, **options)
+        self.addCleanup(writer.stop)
+        return writer
+
+    def entry(self, access_type='view'):
+        return FileAccessLog(
+            user=self.user, owner=self.user, file_name='notes.txt', file_type='text/plain',
+            access_type=access_type, timestamp=timezone.now(),
+        )
+
+    def test_flush_writes_batches_and_counts_activity(self):
+        get_storage_stats(self.user)
+        writer = self.writer(batch_size=100)
+        for _ in range(3):
+            writer.log(self.entry())
+        self.assertEqual(FileAccessLog.objects.count(), 0)
+        self.assertEqual(writer.flush(), 3)
+        self.assertEqual(FileAccessLog.objects.count(), 3)
+        stats = get_storage_stats(self.user)
+        self.assertEqual(stats.activity_count, 3)
+        self.assertIsNotNone(stats.last_activity_at)
+        self.assertEqual(writer.metrics()['written'], 3)
+
+    def test_full_queue_writes_synchronously(self):
+        writer = self.writer(batch_size=100, max_queue=1)
+        writer.log(self.entry())
+        writer.log(self.entry('download'))
+        self.assertEqual(list(FileAccessLog.objects.values_list('access_type', flat=True)), ['download'])
+        self.assertEqual(writer.metrics()['overflowed'], 1)
+        writer.flush()
+        self.assertEqual(FileAccessLog.objects.count(), 2)
+
+
+class CompressionTests(VaultTestCase):
+    text = b'quarterly figures, line after line of them\n' * 2000
+
+    def test_codec_choice(self):
+        self.assertEqual(choose_codec('text/plain', self.text), 'zlib')
+        self.assertEqual(choose_codec('image/jpeg', self.text), '')
+        self.assertEqual(choose_codec('text/plain', os.urandom(4096)), '')
+        self.assertEqual(choose_codec('text/plain', b'tiny'), '')
+        with override_settings(VAULT_COMPRESSION=''):
+            self.assertEqual(choose_codec('text/plain', self.text), '')
+
+    def test_round_trip(self):
+        for codec in ('zlib', 'lzma'):
+            with self.subTest(codec=codec):
+                compressed = list(compress_chunks([self.text[:1000], self.text[1000:]], codec))
+                pieces = list(decompress_chunks(iter(compressed), codec))
+                self.assertEqual(b''.join(pieces), self.text)
+
+    def test_decompression_is_bounded(self):
+        compressed = b''.join(compress_chunks([bytes(4 * DECOMPRESS_STEP)], 'zlib'))
+        pieces = list(decompress_chunks([compressed], 'zlib'))
+        self.assertEqual(sum(map(len, pieces)), 4 * DECOMPRESS_STEP)
+        self.assertLessEqual(max(map(len, pieces)), DECOMPRESS_STEP)
+
+    def test_truncated_stream(self):
+        compressed = b''.join(compress_chunks([self.text], 'zlib'))
+        with self.assertRaises(ValueError):
+            b''.join(decompress_chunks([compressed[:-8]], 'zlib'))
+
+    def test_stored_file_is_compressed(self):
+        encrypted_file = self.stored_file(self.text, 'pw')
+        self.assertEqual(encrypted_file.compression, 'zlib')
+        self.assertLess(get_blob_store().size(encrypted_file.blob_key), len(self.text) // 10)
+        self.assertEqual(b''.join(iter_decrypted_file(encrypted_file, 'pw')), self.text)
+
+
+def png_image(width: int, height: int) -> SimpleUploadedFile:
+    out = io.BytesIO()
+    Image.new('RGB', (width, height), (200, 40, 40)).save(out, 'PNG')
+    return SimpleUploadedFile('photo.png', out.getvalue(), 'image/png')
+
+
+class ThumbnailTests(VaultTestCase):
+    def test_make_thumbnail(self):
+        upload = png_image(1200, 600)
+        with override_settings(VAULT_THUMBNAIL_SIZE=100):
+            with Image.open(io.BytesIO(make_thumbnail(upload, 'image/png'))) as thumbnail:
+                self.assertEqual((thumbnail.format, thumbnail.size), ('JPEG', (100, 50)))
+        self.assertEqual(upload.tell(), 0)
+        self.assertIsNone(make_thumbnail(upload, 'text/plain'))
+        self.assertIsNone(make_thumbnail(SimpleUploadedFile('bad.png', b'not an image'), 'image/png'))
+
+    def test_preview_is_encrypted_under_the_file_key(self):
+        upload = png_image(800, 800)
+        encrypted_file = self.stored_file(upload.read(), 'pw', name='photo.png', file_type='image/png',
+                                          thumbnail_source=upload)
+        blob = get_blob_store().open_read(encrypted_file.thumbnail_key)
+        self.addCleanup(blob.close)
+        self.assertEqual(blob[:4], b'SVLT')
+        with self.assertRaises(ValueError):
+            _read_verified_thumbnail(encrypted_file, 'not pw', None)
+
+        self.client.force_login(self.user)
+        response = self.client.post(f'/vault/preview/{encrypted_file.id}/', {'password': 'pw'})
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        with Image.open(io.BytesIO(response.content)) as thumbnail:
+            self.assertLessEqual(max(thumbnail.size), 320)
+
+    def test_files_without_a_preview(self):
+        encrypted_file = self.stored_file(b'contents', 'pw')
+        self.assertEqual(encrypted_file.thumbnail_key, '')
+        self.client.force_login(self.user)
+        self.assertRedirects(self.client.get(f'/vault/preview/{encrypted_file.id}/'), '/vault/files/',
+                             fetch_redirect_response=False)
+
+
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        replica = mock.patch.dict(settings.DATABASES, {'replica': dict(settings.DATABASES['default'])})
+        replica.start()
+        self.addCleanup(replica.stop)
+
+    def test_reads_use_the_replica_unless_pinned(self):
+        self.assertEqual(self.router.db_for_read(EncryptedFile), 'replica')
+        self.assertEqual(self.router.db_for_write(EncryptedFile), 'default')
+        token = use_primary.set(True)
+        try:
+            self.assertEqual(self.router.db_for_read(EncryptedFile), 'default')
+            # Pool jobs run in a copy of the submitting context
+            self.assertTrue(CryptoExecutor(max_workers=1).run(use_primary.get))
+        finally:
+            use_primary.reset(token)
+        self.assertFalse(self.router.allow_migrate('replica', 'vault'))
+
+    def test_without_a_replica_everything_uses_default(self):
+        del settings.DATABASES['replica']
+        self.assertEqual(self.router.db_for_read(EncryptedFile), 'default')
+
+    def test_middleware_pins_writers(self):
+        seen = []
+
+        def get_response(request):
+            seen.append(use_primary.get())
+            return HttpResponse()
+
+        middleware = ReplicaPinningMiddleware(get_response)
+        factory = RequestFactory()
+        self.assertNotIn(PIN_COOKIE, middleware(factory.get('/')).cookies)
+        response = middleware(factory.post('/'))
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], settings.DATABASE_REPLICA_PIN_SECONDS)
+        pinned_read = factory.get('/')
+        pinned_read.COOKIES[PIN_COOKIE] = '1'
+        middleware(pinned_read)
+        self.assertEqual(seen, [False, True, True])
+        self.assertFalse(use_primary.get())
+
+
+class FileApiTests(VaultTestCase):
+    def setUp(self):
+        super().setUp()
+        self.report = self.file_row('report.pdf', 'application/pdf', 2048)
+        self.file_row('notes.txt')
+        self.client.force_login(self.user)
+
+    def test_requires_login(self):
+        self.client.logout()
+        self.assertEqual(self.client.get('/vault/api/files/').status_code, 401)
+
+    def test_collection_etag_and_304(self):
+        response = self.client.get('/vault/api/files/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([f['name'] for f in response.json()['results']], ['notes.txt', 'report.pdf'])
+        etag = response['ETag']
+
+        response = self.client.get('/vault/api/files/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        self.file_row('new.txt')
+        response = self.client.get('/vault/api/files/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_fields_and_paging(self):
+        response = self.client.get('/vault/api/files/', {'fields': 'name,size', 'limit': 1})
+        body = response.json()
+        self.assertEqual(body['results'], [{'id': body['results'][0]['id'], 'name': 'notes.txt', 'size': 0}])
+        response = self.client.get(body['next'])
+        self.assertEqual(response.json()['results'][0]['name'], 'report.pdf')
+        self.assertIsNone(response.json()['next'])
+        self.assertEqual(self.client.get('/vault/api/files/', {'fields': 'password'}).status_code, 400)
+
+    def test_detail_etag_and_last_modified(self):
+        url = f'/vault/api/files/{self.report.id}/'
+        response = self.client.get(url)
+        self.assertEqual(response.json()['name'], 'report.pdf')
+        self.assertIn('Last-Modified', response)
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': response['ETag']}).status_code, 304)
+
+        self.report.original_filename = 'renamed.pdf'
+        self.report.save()
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': response['ETag']}).status_code, 200)
+
+    def test_other_users_files_are_hidden(self):
+        other = get_user_model().objects.create_user(username='bob', password='pw')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(f'/vault/api/files/{self.report.id}/').status_code, 404)
+        self.assertEqual(self.client.get('/vault/api/files/').json()['results'], [])
+
+
+class RetentionTests(VaultTestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = timezone.now()
+        self.old = [self.log_entry(access_type, self.now - timedelta(days=days))
+                    for days, access_type in ((100, 'view'), (100, 'download'), (100, 'view'), (95, 'view'))]
+        self.recent = self.log_entry('view', self.now)
+        self.activity = rebuild_storage_stats(self.user.pk).activity_count
+
+    def archive(self):
+        return archive_access_logs(retention_cutoff(90), self.root, batch_size=2)
+
+    def test_archive_rolls_up_exports_and_deletes(self):
+        # Rollup rows touched per batch: the 100-day views appear in both batches
+        self.assertEqual(self.archive(), {'archived': 4, 'segments': 2, 'rollups': 4})
+        self.assertEqual(list(FileAccessLog.objects.values_list('id', flat=True)), [self.recent.id])
+
+        counts = {(timezone.localdate(e.timestamp), e.access_type): 0 for e in self.old}
+        for entry in self.old:
+            counts[timezone.localdate(entry.timestamp), entry.access_type] += 1
+        self.assertEqual(
+            {(r.day, r.access_type): r.count for r in AccessLogRollup.objects.filter(owner=self.user)}, counts
+        )
+        # Archived entries keep counting towards the owner's activity
+        self.assertEqual(rebuild_storage_stats(self.user.pk).activity_count, self.activity)
+
+        archived_ids = []
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                with gzip.open(os.path.join(directory, name)) as segment:
+                    archived_ids += [json.loads(line)['id'] for line in segment]
+        self.assertEqual(sorted(archived_ids), sorted(e.id for e in self.old))
+
+        self.assertEqual(self.archive(), {'archived': 0, 'segments': 0, 'rollups': 0})
+
+    def test_daily_summary(self):
+        self.archive()
+        summary = daily_summary(AccessLogRollup.objects.filter(owner=self.user), 10)
+        self.assertEqual([(day['total'], day['view'], day['download']) for day in summary], [(1, 1, None), (3, 2, 1)])
+
+    def test_rollups_survive_a_concurrent_insert(self):
+        rows = [{'owner_id': self.user.id, 'timestamp': self.now, 'access_type': 'view'}] * 2
+        add_to_rollups(rows)
+        update = QuerySet.update
+        calls = []
+
+        def racing_update(queryset, **kwargs):
+            # The first increment misses because another run has not committed its row yet
+            calls.append(kwargs)
+            return 0 if len(calls) == 1 else update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', racing_update):
+            self.assertEqual(add_to_rollups(rows), 1)
+        self.assertEqual(AccessLogRollup.objects.get(owner=self.user).count, 4)
+
+    def test_dry_run(self):
+        out = io.StringIO()
+        call_command('archive_access_logs', '--dry-run', stdout=out)
+        self.assertIn('4 entries', out.getvalue())
+        self.assertEqual(FileAccessLog.objects.count(), 5)
+
+
+def b64(data: bytes) -> str:
+    return base64.b64encode(data).decode()
+
+
+class ClientEncryptionTests(VaultTestCase):
+    """Uploads encrypted in the browser, using the known-answer vector as the ciphertext."""
+
+    def save(self, ciphertext=KAT_CIPHERTEXT, file_size=len(KAT_PLAINTEXT), salt=KAT_SALT,
+             nonce_prefix=KAT_NONCE_PREFIX, wrapped_key=KAT_WRAPPED_KEY):
+        return save_client_ciphertext(io.BytesIO(ciphertext), len(ciphertext), file_size, salt, nonce_prefix,
+                                      KAT_KEY_CHECK, wrapped_key)
+
+    def test_valid_ciphertext_is_stored_as_is(self):
+        stored = self.save()
+        self.assertTrue(stored['client_encrypted'])
+        encrypted_file = EncryptedFile.objects.create(
+            user=self.user, filename='kat.txt', original_filename='kat.txt', file_type='text/plain',
+            file_size=len(KAT_PLAINTEXT), **stored
+        )
+        self.assertEqual(b''.join(iter_decrypted_file(encrypted_file, KAT_PASSWORD)), KAT_PLAINTEXT)
+
+    def test_mismatched_uploads_are_rejected(self):
+        oversized_chunks = bytearray(KAT_CIPHERTEXT)
+        oversized_chunks[5:9] = (32 * 1024 * 1024).to_bytes(4, 'big')
+        cases = {
+            'size': dict(file_size=len(KAT_PLAINTEXT) + 1),
+            'truncated': dict(ciphertext=KAT_CIPHERTEXT[:-1]),
+            'salt': dict(salt=bytes(16)),
+            'nonce prefix': dict(nonce_prefix=bytes(7)),
+            'magic': dict(ciphertext=b'XXXX' + KAT_CIPHERTEXT[4:]),
+            'chunk size': dict(ciphertext=bytes(oversized_chunks)),
+            'wrapped key': dict(wrapped_key=KAT_WRAPPED_KEY[:-8]),
+        }
+        for name, arguments in cases.items():
+            with self.subTest(name):
+                with self.assertRaises(ValueError):
+                    self.save(**arguments)
+
+    def test_upload_view_sanitises_the_file_name(self):
+        self.client.force_login(self.user)
+        data = {
+            'ciphertext': SimpleUploadedFile('blob', KAT_CIPHERTEXT),
+            'filename': 'C:\\Users\\me\\"ab\x07".txt',
+            'file_type': 'text/plain',
+            'file_size': len(KAT_PLAINTEXT),
+            'salt': b64(KAT_SALT),
+            'iv': b64(KAT_NONCE_PREFIX),
+            'key_check': b64(KAT_KEY_CHECK),
+            'wrapped_key': b64(KAT_WRAPPED_KEY),
+        }
+        with override_settings(VAULT_CLIENT_ENCRYPTION=False):
+            self.assertEqual(self.client.post('/vault/upload/client/', data).status_code, 404)
+        data['ciphertext'].seek(0)
+        with override_settings(VAULT_CLIENT_ENCRYPTION=True):
+            response = self.client.post('/vault/upload/client/', data)
+        self.assertEqual(response.status_code, 200)
+        encrypted_file = EncryptedFile.objects.get(pk=response.json()['id'])
+        self.assertEqual(encrypted_file.original_filename, 'ab.txt')
+        self.assertTrue(encrypted_file.client_encrypted)
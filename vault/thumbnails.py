@@ -0,0 +1,33 @@
+import io
+from django.conf import settings
+from PIL import Image
+
+# Formats Pillow can decode that are worth previewing
+THUMBNAIL_TYPES = (
+    'image/jpeg', 'image/png', 'image/gif', 'image/webp', 'image/bmp', 'image/tiff',
+)
+
+
+def make_thumbnail(source, file_type: str):
+    """Render a small JPEG preview of an uploaded image, or None if it is not one.
+
+    `source` is a readable, seekable file such as an UploadedFile. JPEGs are
+    scaled down by the decoder, so the full-size bitmap is never built.
+    """
+    if not (file_type or '').lower().startswith(THUMBNAIL_TYPES):
+        return None
+    size = getattr(settings, 'VAULT_THUMBNAIL_SIZE', 320)
+    try:
+        source.seek(0)
+        with Image.open(source) as image:
+            image.draft('RGB', (size, size))
+            image = image.convert('RGB')
+            image.thumbnail((size, size))
+            out = io.BytesIO()
+            image.save(out, 'JPEG', quality=getattr(settings, 'VAULT_THUMBNAIL_QUALITY', 80), optimize=True)
+            return out.getvalue()
+    except Exception as e:
+        print(f"Could not build thumbnail: {str(e)}")
+        return None
+    finally:
+        source.seek(0)
@@ -0,0 +1,115 @@
+import os
+from django.conf import settings
+from .compression import choose_codec, new_compressor
+from .models import EncryptedFile
+from .storage import get_blob_store, new_blob_key
+from .utils import (
+    DATA_KEY_SIZE, FORMAT_CHUNKED_GCM, FORMAT_LEGACY_CBC, StreamEncryptor, compute_key_check,
+    delete_encrypted_file, generate_key, iter_decrypted_file_with_key, legacy_padding_length, unwrap_file_key,
+    wrap_data_key,
+)
+
+
+def needs_upgrade(encrypted_file) -> bool:
+    """Whether a file is still stored in the legacy AES-CBC layout."""
+    return encrypted_file.format_version == FORMAT_LEGACY_CBC
+
+
+def password_confirmed(encrypted_file, key: bytes) -> bool:
+    """Strict check that `key` opens a legacy file, good enough to rewrite it.
+
+    CBC is unauthenticated, so the only evidence is the padding. The padding
+    length must match the stored plaintext size exactly and span at least
+    VAULT_UPGRADE_MIN_PADDING bytes; otherwise a wrong password could slip
+    through and the original ciphertext would be replaced by garbage.
+    """
+    try:
+        # Re-keyed legacy files keep their original key wrapped under the new one
+        data_key = unwrap_file_key(encrypted_file, key)
+    except ValueError:
+        return False
+    return legacy_padding_length(encrypted_file, data_key) >= getattr(settings, 'VAULT_UPGRADE_MIN_PADDING', 4)
+
+
+def iter_upgrading_file(encrypted_file, password: str, cache_scope: str = None):
+    """Yield a legacy file's plaintext while re-encrypting it into the current format.
+
+    The first chunk is decrypted before this returns, like
+    `iter_decrypted_file`. The upgraded copy replaces the legacy ciphertext
+    only once the whole file has streamed through; an abandoned download
+    leaves the file as it was. Files whose password cannot be confirmed
+    strictly are streamed without being upgraded.
+    """
+    key, _ = generate_key(password, bytes(encrypted_file.salt), cache_scope)
+    return iter_upgrading_file_with_key(encrypted_file, key)
+
+
+def iter_upgrading_file_with_key(encrypted_file, key: bytes):
+    """Like `iter_upgrading_file`, but with the password-derived key already known."""
+    plaintext = iter_decrypted_file_with_key(encrypted_file, unwrap_file_key(encrypted_file, key))
+    if not password_confirmed(encrypted_file, key):
+        return plaintext
+    return _reencrypt(encrypted_file, plaintext, key, bytes(encrypted_file.salt))
+
+
+def upgrade_file(encrypted_file, password: str, cache_scope: str = None) -> int:
+    """Upgrade one legacy file in place; returns plaintext bytes processed, or None if skipped."""
+    if not needs_upgrade(encrypted_file):
+        return None
+    key, salt = generate_key(password, bytes(encrypted_file.salt), cache_scope)
+    if not password_confirmed(encrypted_file, key):
+        return None
+    plaintext = iter_decrypted_file_with_key(encrypted_file, unwrap_file_key(encrypted_file, key))
+    processed = 0
+    for chunk in _reencrypt(encrypted_file, plaintext, key, salt):
+        processed += len(chunk)
+    return processed
+
+
+def _reencrypt(encrypted_file, plaintext, key: bytes, salt: bytes):
+    """Pass plaintext through while writing it as an envelope-encrypted blob, then swap it in."""
+    store = get_blob_store()
+    blob_key = new_blob_key()
+    data_key = os.urandom(DATA_KEY_SIZE)
+    compressor = None
+    compression = ''
+    try:
+        with store.open_write(blob_key) as out:
+            encryptor = StreamEncryptor(data_key, salt, out)
+            for index, chunk in enumerate(plaintext):
+                if index == 0:
+                    compression = choose_codec(encrypted_file.file_type, chunk)
+                    compressor = new_compressor(compression) if compression else None
+                encryptor.write(compressor.compress(chunk) if compressor else chunk)
+                yield chunk
+            if compressor:
+                encryptor.write(compressor.flush())
+            nonce_prefix = encryptor.finish()
+    finally:
+        plaintext.close()
+
+    try:
+        # Only swap in if nobody upgraded, moved or re-keyed the file meanwhile
+        updated = EncryptedFile.objects.filter(
+            pk=encrypted_file.pk, format_version=FORMAT_LEGACY_CBC, blob_key=encrypted_file.blob_key,
+            salt=bytes(encrypted_file.salt)
+        ).update(
+            blob_key=blob_key,
+            encrypted_data=None,
+            encrypted_path='',
+            iv=nonce_prefix,
+            key_check=compute_key_check(key),
+            wrapped_key=wrap_data_key(key, data_key),
+            compression=compression,
+            format_version=FORMAT_CHUNKED_GCM,
+        )
+    except Exception:
+        store.delete(blob_key)
+        raise
+    if not updated:
+        store.delete(blob_key)
+        return
+
+    if encrypted_file.blob_key:
+        store.delete(encrypted_file.blob_key)
+    delete_encrypted_file(encrypted_file.encrypted_path)
@@ -1,10 +1,25 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, views
+
+if settings.VAULT_ASYNC_VIEWS:
+    from . import async_views as transfer_views
+else:
+    transfer_views = views
 
 urlpatterns = [
-    path('upload/', views.upload_file, name='upload-file'),
-    path('files/', views.file_list, name='file-list'),
-    path('download/<int:file_id>/', views.download_file, name='download-file'),
+    path('upload/', transfer_views.upload_file, name='upload-file'),
+    path('upload/bulk/', views.bulk_upload, name='bulk-upload'),
+    path('upload/client/', views.upload_client_encrypted, name='upload-client-encrypted'),
+    path('files/', transfer_views.file_list, name='file-list'),
+    path('files/search/', views.file_search, name='file-search'),
+    path('download/<int:file_id>/', transfer_views.download_file, name='download-file'),
+    path('ciphertext/<int:file_id>/', views.download_ciphertext, name='download-ciphertext'),
+    path('preview/<int:file_id>/', views.preview_file, name='preview-file'),
     path('delete/<int:file_id>/', views.delete_file, name='delete-file'),
+    path('rekey/', views.rekey_vault, name='rekey-vault'),
     path('logs/', views.access_logs, name='access-logs'),
-] 
\ No newline at end of file
+    path('metrics/', views.vault_metrics, name='vault-metrics'),
+    path('api/files/', api.file_collection, name='api-file-collection'),
+    path('api/files/<int:file_id>/', api.file_detail, name='api-file-detail'),
+]
@@ -1,14 +1,51 @@
+import hashlib
+import hmac
+import mmap
 import os
+import shutil
+import struct
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.keywrap import InvalidUnwrap, aes_key_unwrap, aes_key_wrap
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.backends import default_backend
 from django.conf import settings
+from .compression import compress_upload, decompress_chunks
+from .keycache import key_cache
+from .storage import get_blob_store, new_blob_key
+from .thumbnails import make_thumbnail
 
-def generate_key(password: str, salt: bytes = None) -> tuple:
-    """Generate an encryption key from a password using PBKDF2."""
+# Storage formats recorded in EncryptedFile.format_version
+FORMAT_LEGACY_CBC = 1
+FORMAT_CHUNKED_GCM = 2
+
+# Chunked format header: magic, version, chunk size, salt, nonce prefix
+STREAM_MAGIC = b'SVLT'
+STREAM_HEADER = struct.Struct('>4sBI16s7s')
+DEFAULT_CHUNK_SIZE = 64 * 1024
+TAG_SIZE = 16
+# Largest chunk size accepted in ciphertext encrypted by the browser
+MAX_CHUNK_SIZE = 16 * 1024 * 1024
+
+KEY_CHECK_LABEL = b'secure-vault key check'
+
+# Random per-file key that encrypts the contents; the password-derived key only wraps it
+DATA_KEY_SIZE = 32
+
+def generate_key(password: str, salt: bytes = None, cache_scope: str = None) -> tuple:
+    """Generate an encryption key from a password using PBKDF2.
+
+    When `cache_scope` is given (normally the login session), keys are kept in
+    the in-process key cache so re-entering the same password skips the KDF.
+    """
     if salt is None:
         salt = os.urandom(16)
+    else:
+        key = key_cache.get(cache_scope, salt, password)
+        if key is not None:
+            return key, salt
     
     kdf = PBKDF2HMAC(
         algorithm=hashes.SHA256(),
@@ -18,6 +55,7 @@ def generate_key(password: str, salt: bytes = None) -> tuple:
         backend=default_backend()
     )
     key = kdf.derive(password.encode())
+    key_cache.set(cache_scope, salt, password, key)
     return key, salt
 
 def encrypt_file(file_data: bytes, password: str) -> tuple:
@@ -78,4 +116,445 @@ def get_decrypted_file(file_path: str, password: str, salt: bytes, iv: bytes) ->
     with open(os.path.join(settings.ENCRYPTED_FILES_ROOT, file_path), 'rb') as f:
         encrypted_data = f.read()
     
-    return decrypt_file(encrypted_data, password, salt, iv) 
\ No newline at end of file
+    return decrypt_file(encrypted_data, password, salt, iv)
+
+def get_chunk_size() -> int:
+    """Plaintext bytes per authenticated chunk for new uploads."""
+    return getattr(settings, 'VAULT_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+
+def _chunk_nonce(nonce_prefix: bytes, counter: int, last: bool) -> bytes:
+    """Build the 96-bit GCM nonce for a chunk: prefix, counter and a last-chunk flag."""
+    return nonce_prefix + struct.pack('>IB', counter, 1 if last else 0)
+
+def encrypt_stream(chunks, password: str, out, chunk_size: int = None, cache_scope: str = None) -> tuple:
+    """Encrypt an iterable of byte chunks into `out` using chunked AES-256-GCM.
+
+    Each fixed-size plaintext chunk is sealed on its own, so only one chunk
+    is held in memory at a time. The final chunk carries a flag in its nonce
+    which lets the reader detect truncation. Returns (salt, nonce_prefix,
+    key_check).
+    """
+    key, salt = generate_key(password, cache_scope=cache_scope)
+    nonce_prefix = encrypt_stream_with_key(chunks, key, salt, out, chunk_size)
+    return salt, nonce_prefix, compute_key_check(key)
+
+def encrypt_stream_with_key(chunks, key: bytes, salt: bytes, out, chunk_size: int = None) -> bytes:
+    """Like `encrypt_stream`, but with an already derived key; returns the nonce prefix."""
+    encryptor = StreamEncryptor(key, salt, out, chunk_size)
+    for data in chunks:
+        encryptor.write(data)
+    return encryptor.finish()
+
+class StreamEncryptor:
+    """Push-style writer for the chunked AES-256-GCM format.
+
+    Plaintext is fed with `write` in pieces of any size and sealed into
+    `out` one chunk at a time. A full chunk is held back until more data
+    arrives, so `finish` can flag the true last chunk.
+    """
+
+    def __init__(self, key: bytes, salt: bytes, out, chunk_size: int = None):
+        self.chunk_size = chunk_size or get_chunk_size()
+        self.nonce_prefix = os.urandom(7)
+        self.header = STREAM_HEADER.pack(STREAM_MAGIC, FORMAT_CHUNKED_GCM, self.chunk_size, salt, self.nonce_prefix)
+        self.out = out
+        self._aesgcm = AESGCM(key)
+        self._buffer = bytearray()
+        self._counter = 0
+        out.write(self.header)
+
+    def write(self, data: bytes) -> None:
+        self._buffer += data
+        while len(self._buffer) > self.chunk_size:
+            self._seal(bytes(self._buffer[:self.chunk_size]), False)
+            del self._buffer[:self.chunk_size]
+
+    def finish(self) -> bytes:
+        """Seal the final chunk and return the nonce prefix."""
+        self._seal(bytes(self._buffer), True)
+        self._buffer.clear()
+        return self.nonce_prefix
+
+    def _seal(self, chunk: bytes, last: bool) -> None:
+        nonce = _chunk_nonce(self.nonce_prefix, self._counter, last)
+        self.out.write(self._aesgcm.encrypt(nonce, chunk, self.header))
+        self._counter += 1
+
+def read_stream_header(source) -> tuple:
+    """Read and validate the chunked format header, returning (header, chunk_size, salt, nonce_prefix)."""
+    header = source.read(STREAM_HEADER.size)
+    if len(header) != STREAM_HEADER.size:
+        raise ValueError('Encrypted file is truncated')
+    magic, version, chunk_size, salt, nonce_prefix = STREAM_HEADER.unpack(header)
+    if magic != STREAM_MAGIC or version != FORMAT_CHUNKED_GCM:
+        raise ValueError('Unsupported encrypted file format')
+    return header, chunk_size, salt, nonce_prefix
+
+def decrypt_stream(source, password: str, cache_scope: str = None):
+    """Yield decrypted chunks from a file-like object written by `encrypt_stream`.
+
+    Raises ValueError if the password is wrong or the data has been tampered
+    with or truncated. At most two ciphertext chunks are buffered.
+    """
+    header, chunk_size, salt, nonce_prefix = read_stream_header(source)
+    key, _ = generate_key(password, salt, cache_scope)
+    yield from _open_chunks(source, key, header, chunk_size, nonce_prefix)
+
+def decrypt_stream_with_key(source, key: bytes):
+    """Like `decrypt_stream`, but with the data key already known."""
+    header, chunk_size, _, nonce_prefix = read_stream_header(source)
+    yield from _open_chunks(source, key, header, chunk_size, nonce_prefix)
+
+def _open_chunks(source, key: bytes, header: bytes, chunk_size: int, nonce_prefix: bytes):
+    aesgcm = AESGCM(key)
+
+    sealed_size = chunk_size + TAG_SIZE
+    current = source.read(sealed_size)
+    counter = 0
+    while True:
+        following = source.read(sealed_size)
+        last = not following
+        try:
+            yield aesgcm.decrypt(_chunk_nonce(nonce_prefix, counter, last), current, header)
+        except InvalidTag:
+            raise ValueError('Invalid password or corrupted file')
+        if last:
+            return
+        current = following
+        counter += 1
+
+def decrypt_legacy_stream(encrypted_data: bytes, password: str, salt: bytes, iv: bytes,
+                          chunk_size: int = None, cache_scope: str = None):
+    """Yield decrypted chunks of a legacy AES-256-CBC blob without copying it whole."""
+    key, _ = generate_key(password, salt, cache_scope)
+    yield from decrypt_legacy_stream_with_key(encrypted_data, key, iv, chunk_size)
+
+def decrypt_legacy_stream_with_key(encrypted_data: bytes, key: bytes, iv: bytes, chunk_size: int = None):
+    """Like `decrypt_legacy_stream`, but with the key already known."""
+    chunk_size = (chunk_size or get_chunk_size()) // 16 * 16 or 16
+    if not encrypted_data or len(encrypted_data) % 16:
+        raise ValueError('Invalid password or corrupted file')
+    decryptor = Cipher(algorithms.AES(key), modes.CBC(iv), backend=default_backend()).decryptor()
+
+    with memoryview(encrypted_data) as view:
+        # Hold back the final block so its padding can be stripped
+        body_end = len(view) - 16
+        for start in range(0, body_end, chunk_size):
+            yield decryptor.update(view[start:min(start + chunk_size, body_end)])
+        last_block = decryptor.update(view[body_end:]) + decryptor.finalize()
+    padding_length = last_block[-1]
+    if not 1 <= padding_length <= 16:
+        raise ValueError('Invalid password or corrupted file')
+    yield last_block[:-padding_length]
+
+def compute_key_check(key: bytes) -> bytes:
+    """Derive a short value that confirms a key without revealing it."""
+    return hmac.new(key, KEY_CHECK_LABEL, hashlib.sha256).digest()[:16]
+
+def wrap_data_key(key: bytes, data_key: bytes) -> bytes:
+    """Wrap a file's data key under a password-derived key (RFC 3394 AES key wrap)."""
+    return aes_key_wrap(key, data_key, default_backend())
+
+def unwrap_data_key(key: bytes, wrapped_key: bytes) -> bytes:
+    """Recover a data key; raises ValueError if `key` is not the one it was wrapped with."""
+    try:
+        return aes_key_unwrap(key, wrapped_key, default_backend())
+    except InvalidUnwrap:
+        raise ValueError('Invalid password or corrupted file')
+
+def get_data_key(encrypted_file, password: str, cache_scope: str = None) -> bytes:
+    """Return the key an EncryptedFile's contents are encrypted under.
+
+    Envelope-encrypted files unwrap their stored data key; older files are
+    encrypted directly under the password-derived key.
+    """
+    key, _ = generate_key(password, bytes(encrypted_file.salt), cache_scope)
+    return unwrap_file_key(encrypted_file, key)
+
+def unwrap_file_key(encrypted_file, key: bytes) -> bytes:
+    """Like `get_data_key`, but with the password-derived key already known."""
+    if encrypted_file.wrapped_key:
+        return unwrap_data_key(key, bytes(encrypted_file.wrapped_key))
+    return key
+
+def rekey_files(encrypted_files, old_password: str, new_password: str, new_salt: bytes,
+                cache_scope: str = None) -> tuple:
+    """Rewrap the data keys `old_password` opens under `new_password`; returns unsaved (rekeyed, skipped)."""
+    new_key, _ = generate_key(new_password, new_salt, cache_scope)
+    new_check = compute_key_check(new_key)
+    old_keys = {}
+    rekeyed, skipped = [], []
+    for encrypted_file in encrypted_files:
+        if not encrypted_file.key_check and encrypted_file.format_version != FORMAT_CHUNKED_GCM:
+            # Legacy CBC padding alone cannot confirm the password reliably
+            skipped.append(encrypted_file)
+            continue
+        salt = bytes(encrypted_file.salt)
+        # One KDF per distinct salt; files sharing their owner's key salt share it
+        if salt not in old_keys:
+            old_keys[salt], _ = generate_key(old_password, salt, cache_scope)
+        try:
+            if not verify_key(encrypted_file, old_keys[salt]):
+                skipped.append(encrypted_file)
+                continue
+            data_key = unwrap_file_key(encrypted_file, old_keys[salt])
+        except (ValueError, FileNotFoundError):
+            skipped.append(encrypted_file)
+            continue
+        encrypted_file.wrapped_key = wrap_data_key(new_key, data_key)
+        encrypted_file.salt = new_salt
+        encrypted_file.key_check = new_check
+        rekeyed.append(encrypted_file)
+    return rekeyed, skipped
+
+def verify_password(encrypted_file, password: str, cache_scope: str = None) -> bool:
+    """Check a password against an EncryptedFile without decrypting its contents."""
+    key, _ = generate_key(password, bytes(encrypted_file.salt), cache_scope)
+    return verify_key(encrypted_file, key)
+
+def verify_key(encrypted_file, key: bytes) -> bool:
+    """Like `verify_password`, but with the password-derived key already known."""
+    if encrypted_file.key_check:
+        return hmac.compare_digest(compute_key_check(key), bytes(encrypted_file.key_check))
+
+    # Older files fall back to their first chunk or legacy padding, then get a key check
+    if encrypted_file.format_version == FORMAT_CHUNKED_GCM:
+        try:
+            chunks = iter_decrypted_file_with_key(encrypted_file, unwrap_file_key(encrypted_file, key))
+        except ValueError:
+            return False
+        # Start the generator so that closing it also closes the ciphertext source
+        next(chunks)
+        chunks.close()
+        _backfill_key_check(encrypted_file, key)
+        return True
+
+    padding_length = legacy_padding_length(encrypted_file, key)
+    if padding_length >= getattr(settings, 'VAULT_UPGRADE_MIN_PADDING', 4):
+        # Only padding this long is strong enough evidence to record
+        _backfill_key_check(encrypted_file, key)
+    return padding_length > 0
+
+def _backfill_key_check(encrypted_file, key: bytes) -> None:
+    encrypted_file.key_check = compute_key_check(key)
+    type(encrypted_file).objects.filter(pk=encrypted_file.pk).update(key_check=encrypted_file.key_check)
+
+def legacy_padding_length(encrypted_file, key: bytes) -> int:
+    """Decrypt only the last CBC block of a legacy file and check its padding.
+
+    Returns the padding length if it is well formed and exactly covers the gap
+    between the ciphertext and the stored plaintext size, else 0. This is
+    unauthenticated: a wrong key passes with odds of 1 in 256 ** length.
+    """
+    source = open_ciphertext(encrypted_file)
+    data = source if source is not None else encrypted_file.encrypted_data
+    try:
+        if not data or len(data) % 16:
+            return 0
+        padding_length = len(data) - encrypted_file.file_size
+        if not 1 <= padding_length <= 16:
+            return 0
+        previous = data[-32:-16] if len(data) > 16 else bytes(encrypted_file.iv)
+        decryptor = Cipher(algorithms.AES(key), modes.CBC(bytes(previous)), backend=default_backend()).decryptor()
+        last_block = decryptor.update(bytes(data[-16:])) + decryptor.finalize()
+    finally:
+        if source is not None:
+            source.close()
+    return padding_length if last_block[-padding_length:] == bytes([padding_length]) * padding_length else 0
+
+def open_ciphertext(encrypted_file):
+    """Open the stored ciphertext of an EncryptedFile, wherever it currently lives.
+
+    Returns a readable file-like object, or None for legacy rows whose
+    ciphertext is still held in the encrypted_data column.
+    """
+    if encrypted_file.blob_key:
+        return get_blob_store().open_read(encrypted_file.blob_key)
+    if encrypted_file.encrypted_path:
+        return open_encrypted_file(encrypted_file.encrypted_path)
+    return None
+
+def iter_decrypted_file(encrypted_file, password: str, cache_scope: str = None):
+    """Yield the plaintext of an EncryptedFile chunk by chunk, whatever its format.
+
+    The first chunk is decrypted before this returns, so a wrong password
+    raises ValueError here rather than midway through a response.
+    """
+    return iter_decrypted_file_with_key(encrypted_file, get_data_key(encrypted_file, password, cache_scope))
+
+def iter_decrypted_file_with_key(encrypted_file, key: bytes):
+    """Like `iter_decrypted_file`, but with the file's data key already known."""
+    source = open_ciphertext(encrypted_file)
+    if source is None and not encrypted_file.encrypted_data:
+        raise FileNotFoundError('Encrypted data not found')
+
+    if encrypted_file.format_version == FORMAT_CHUNKED_GCM:
+        chunks = decrypt_stream_with_key(source, key)
+    else:
+        chunks = decrypt_legacy_stream_with_key(
+            source if source is not None else encrypted_file.encrypted_data,
+            key,
+            bytes(encrypted_file.iv)
+        )
+
+    if encrypted_file.compression:
+        chunks = decompress_chunks(chunks, encrypted_file.compression)
+
+    try:
+        first = next(chunks, b'')
+    except Exception:
+        if source is not None:
+            source.close()
+        raise
+    return _chain_chunks(first, chunks, source)
+
+def _chain_chunks(first: bytes, chunks, source):
+    """Re-attach an already decrypted first chunk and close the source when done."""
+    try:
+        yield first
+        yield from chunks
+    finally:
+        chunks.close()
+        if source is not None:
+            source.close()
+
+def save_encrypted_stream(chunks, password: str, cache_scope: str = None, file_type: str = None,
+                          thumbnail_source=None, salt: bytes = None) -> dict:
+    """Stream-encrypt chunks into the blob store under a fresh random data key.
+
+    The password-derived key only wraps the data key, so changing the
+    password later rewraps a few bytes instead of re-encrypting the file.
+    Compressible content is compressed first, chosen from `file_type` and the
+    first chunk. For images, pass the uploaded file as `thumbnail_source` to
+    also store a small preview under the same data key. Pass the owner's
+    key salt as `salt` so all their files share one password key. Returns
+    the EncryptedFile field values for the stored blobs.
+    """
+    key, salt = generate_key(password, salt, cache_scope)
+    return save_encrypted_stream_with_key(chunks, key, salt, file_type, thumbnail_source)
+
+def save_encrypted_stream_with_key(chunks, key: bytes, salt: bytes, file_type: str = None,
+                                   thumbnail_source=None) -> dict:
+    """Like `save_encrypted_stream`, but with the password-derived key already known."""
+    compression, chunks = compress_upload(chunks, file_type)
+    data_key = os.urandom(DATA_KEY_SIZE)
+    blob_key = new_blob_key()
+    with get_blob_store().open_write(blob_key) as f:
+        # The header keeps the upload-time salt; after a re-key only the row's salt is current
+        nonce_prefix = encrypt_stream_with_key(chunks, data_key, salt, f)
+    return {
+        'blob_key': blob_key,
+        'salt': salt,
+        'iv': nonce_prefix,
+        'key_check': compute_key_check(key),
+        'wrapped_key': wrap_data_key(key, data_key),
+        'compression': compression,
+        'format_version': FORMAT_CHUNKED_GCM,
+        'thumbnail_key': save_thumbnail(thumbnail_source, file_type, data_key) if thumbnail_source else '',
+    }
+
+def sealed_size(file_size: int, chunk_size: int) -> int:
+    """Length of the chunked format ciphertext of `file_size` plaintext bytes."""
+    chunks = max(1, -(-file_size // chunk_size))
+    return STREAM_HEADER.size + file_size + chunks * TAG_SIZE
+
+def save_client_ciphertext(source, size: int, file_size: int, salt: bytes, nonce_prefix: bytes,
+                           key_check: bytes, wrapped_key: bytes) -> dict:
+    """Store ciphertext that was encrypted in the browser into the blob store as is.
+
+    The browser writes the same chunked format as `save_encrypted_stream`, so
+    only its header and length are checked here; the contents cannot be
+    checked without the password. Raises ValueError if the upload does not
+    match the key material sent with it. Returns the EncryptedFile field
+    values.
+    """
+    source.seek(0)
+    _, chunk_size, header_salt, header_prefix = read_stream_header(source)
+    if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+        raise ValueError('Unsupported chunk size')
+    if header_salt != salt or header_prefix != nonce_prefix:
+        raise ValueError('Encrypted file header does not match its key material')
+    if size != sealed_size(file_size, chunk_size):
+        raise ValueError('Encrypted file length does not match its size')
+    if len(key_check) != 16 or len(wrapped_key) != DATA_KEY_SIZE + 8:
+        raise ValueError('Invalid wrapped key')
+
+    source.seek(0)
+    blob_key = new_blob_key()
+    with get_blob_store().open_write(blob_key) as f:
+        shutil.copyfileobj(source, f, get_chunk_size())
+    return {
+        'blob_key': blob_key,
+        'salt': salt,
+        'iv': nonce_prefix,
+        'key_check': key_check,
+        'wrapped_key': wrapped_key,
+        'compression': '',
+        'format_version': FORMAT_CHUNKED_GCM,
+        'thumbnail_key': '',
+        'client_encrypted': True,
+    }
+
+def iter_blob(blob_key: str, chunk_size: int = None):
+    """Open a stored blob and return an iterator over its bytes, unchanged.
+
+    Opening happens before this returns, so a missing blob raises
+    FileNotFoundError here rather than midway through a response.
+    """
+    source = get_blob_store().open_read(blob_key)
+    return _read_chunks(source, chunk_size or get_chunk_size())
+
+def _read_chunks(source, chunk_size: int):
+    try:
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    finally:
+        source.close()
+
+def save_thumbnail(source, file_type: str, data_key: bytes) -> str:
+    """Encrypt a preview of an image upload under its data key; returns the blob key or ''."""
+    thumbnail = make_thumbnail(source, file_type)
+    if thumbnail is None:
+        return ''
+    blob_key = new_blob_key()
+    with get_blob_store().open_write(blob_key) as f:
+        # No password salt applies: the preview is sealed with the file's data key
+        encrypt_stream_with_key([thumbnail], data_key, b'\0' * 16, f)
+    return blob_key
+
+def read_thumbnail(encrypted_file, password: str, cache_scope: str = None) -> bytes:
+    """Decrypt the stored preview of an EncryptedFile."""
+    return read_thumbnail_with_key(encrypted_file, get_data_key(encrypted_file, password, cache_scope))
+
+def read_thumbnail_with_key(encrypted_file, key: bytes) -> bytes:
+    """Like `read_thumbnail`, but with the file's data key already known."""
+    source = get_blob_store().open_read(encrypted_file.thumbnail_key)
+    try:
+        return b''.join(decrypt_stream_with_key(source, key))
+    finally:
+        source.close()
+
+def open_encrypted_file(file_path: str):
+    """Map a legacy encrypted file under ENCRYPTED_FILES_ROOT for reading."""
+    with open(os.path.join(settings.ENCRYPTED_FILES_ROOT, file_path), 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def delete_encrypted_file(file_path: str) -> None:
+    """Remove a legacy encrypted file if it exists."""
+    if not file_path:
+        return
+    try:
+        os.remove(os.path.join(settings.ENCRYPTED_FILES_ROOT, file_path))
+    except FileNotFoundError:
+        pass
+
+def delete_ciphertext(encrypted_file) -> None:
+    """Remove the stored ciphertext of an EncryptedFile from the blob store or legacy path."""
+    if encrypted_file.blob_key:
+        get_blob_store().delete(encrypted_file.blob_key)
+    if encrypted_file.thumbnail_key:
+        get_blob_store().delete(encrypted_file.thumbnail_key)
+    delete_encrypted_file(encrypted_file.encrypted_path)
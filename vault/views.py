@@ -1,14 +1,37 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse, JsonResponse
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.contrib import messages
 from django.conf import settings
-from .models import EncryptedFile, FileAccessLog
-from .forms import FileUploadForm, FileDownloadForm
-from .utils import save_encrypted_file, get_decrypted_file
+from django.urls import reverse
+from django.utils.http import content_disposition_header
+from django.views.decorators.http import require_POST, require_safe
+from .models import AccessLogRollup, EncryptedFile, FileAccessLog
+from .audit import access_log_writer, build_access_log, log_access
+from .cache import bump_user_cache_version, cached_for_user, fragment_context
+from .executor import CryptoPoolSaturated, crypto_executor
+from .forms import (
+    AccessLogFilterForm, BulkUploadForm, ClientUploadForm, FileDownloadForm, FileSearchForm, FileUploadForm,
+    RekeyForm,
+)
+from .keycache import session_scope
+from .pagination import paginate_keyset
+from .retention import daily_summary
+from .stats import (
+    get_storage_stats, record_activity, record_delete, record_upload, record_uploads,
+)
+from .storage import get_blob_store
+from .upgrade import iter_upgrading_file_with_key, needs_upgrade
+from .utils import (
+    delete_ciphertext, generate_key, get_chunk_size, iter_blob, iter_decrypted_file_with_key,
+    read_thumbnail_with_key, rekey_files, save_client_ciphertext, save_encrypted_stream,
+    save_encrypted_stream_with_key, unwrap_file_key, verify_key, verify_password,
+)
+import base64
 import mimetypes
 import os
-from django.db.models import Sum
+from concurrent.futures import FIRST_COMPLETED, wait
+from django.db import transaction
 
 # Create your views here.
 
@@ -21,38 +44,19 @@ def upload_file(request):
             password = form.cleaned_data['password']
             
             try:
-                # Read file content
-                file_content = file.read()
-                
-                # Encrypt file data
-                from .utils import encrypt_file
-                encrypted_data, salt, iv = encrypt_file(file_content, password)
-                
-                # Create file record with encrypted data stored in DB
-                encrypted_file = EncryptedFile.objects.create(
-                    user=request.user,
-                    filename=file.name,
-                    original_filename=file.name,
-                    file_type=file.content_type or 'application/octet-stream',
-                    file_size=file.size,
-                    encrypted_path='',  # No longer using filesystem
-                    encrypted_data=encrypted_data,  # Store in database
-                    salt=salt,
-                    iv=iv
+                # Encrypt chunk by chunk into the blob store on the crypto pool so memory use stays flat
+                stored = crypto_executor.run(
+                    save_encrypted_stream, file.chunks(get_chunk_size()), password, session_scope(request),
+                    file.content_type, file, request.user.get_key_salt()
                 )
                 
-                # Log access
-                FileAccessLog.objects.create(
-                    file=encrypted_file,
-                    user=request.user,
-                    access_type='upload',
-                    ip_address=request.META.get('REMOTE_ADDR'),
-                    user_agent=request.META.get('HTTP_USER_AGENT')
-                )
+                _record_upload(request, stored, file.name, file.content_type, file.size)
                 
                 messages.success(request, 'File uploaded and encrypted successfully.')
                 return redirect('file-list')
             
+            except CryptoPoolSaturated:
+                return _crypto_busy(request)
             except Exception as e:
                 print(f"Error uploading file: {str(e)}")
                 import traceback
@@ -62,7 +66,177 @@ def upload_file(request):
     else:
         form = FileUploadForm()
     
-    return render(request, 'vault/upload.html', {'form': form})
+    return render(request, 'vault/upload.html', _upload_context(form, request.user))
+
+def _upload_context(form, user):
+    context = {'form': form}
+    if settings.VAULT_CLIENT_ENCRYPTION:
+        context['client_chunk_size'] = get_chunk_size()
+        context['client_key_salt'] = base64.b64encode(user.get_key_salt()).decode('ascii')
+    return context
+
+def _record_upload(request, stored, name, content_type, size):
+    """Create the row for an encrypted upload, count it in the user's stats and log it.
+
+    `stored` holds the field values returned by `save_encrypted_stream` or
+    `save_client_ciphertext`.
+    """
+    with transaction.atomic():
+        encrypted_file = EncryptedFile.objects.create(
+            user=request.user,
+            filename=name,
+            original_filename=name,
+            file_type=content_type or 'application/octet-stream',
+            file_size=size,
+            **stored
+        )
+        record_upload(encrypted_file)
+    bump_user_cache_version(request.user.pk)
+    
+    log_access(request, encrypted_file, 'upload')
+    return encrypted_file
+
+@login_required
+@require_POST
+def upload_client_encrypted(request):
+    """Store a file the browser has already encrypted; no password reaches the server."""
+    if not settings.VAULT_CLIENT_ENCRYPTION:
+        return JsonResponse({'success': False, 'message': 'Browser encryption is not enabled.'}, status=404)
+
+    form = ClientUploadForm(request.POST, request.FILES)
+    if not form.is_valid():
+        return JsonResponse({'success': False, 'errors': form.errors}, status=400)
+    data = form.cleaned_data
+
+    try:
+        stored = save_client_ciphertext(
+            data['ciphertext'], data['ciphertext'].size, data['file_size'],
+            data['salt'], data['iv'], data['key_check'], data['wrapped_key']
+        )
+    except ValueError as e:
+        print(f"Rejected browser-encrypted upload: {str(e)}")
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+
+    encrypted_file = _record_upload(request, stored, data['filename'], data['file_type'], data['file_size'])
+
+    messages.success(request, 'File encrypted in your browser and uploaded successfully.')
+    return JsonResponse({'success': True, 'id': encrypted_file.id, 'redirect': reverse('file-list')})
+
+@login_required
+def bulk_upload(request):
+    results = None
+    wants_json = 'application/json' in request.headers.get('Accept', '')
+    
+    if request.method == 'POST':
+        form = BulkUploadForm(request.POST, request.FILES)
+        if form.is_valid():
+            try:
+                results = _store_bulk_upload(request, form.cleaned_data['files'], form.cleaned_data['password'])
+            except CryptoPoolSaturated:
+                return _crypto_busy(request, wants_json)
+            except Exception as e:
+                print(f"Error in bulk upload: {str(e)}")
+                import traceback
+                traceback.print_exc()
+                if wants_json:
+                    return JsonResponse({'success': False, 'message': 'Error uploading files.'}, status=500)
+                messages.error(request, 'Error uploading files. Please try again.')
+                return redirect('bulk-upload')
+            
+            if wants_json:
+                return JsonResponse({'success': True, 'results': results})
+            
+            stored = sum(1 for result in results if result['success'])
+            messages.success(request, f'{stored} of {len(results)} files uploaded and encrypted.')
+        elif wants_json:
+            return JsonResponse({'success': False, 'errors': form.errors}, status=400)
+    else:
+        form = BulkUploadForm()
+    
+    return render(request, 'vault/bulk_upload.html', {'form': form, 'results': results})
+
+def _store_bulk_upload(request, files, password):
+    """Encrypt many uploads under one password and insert their rows in one transaction.
+
+    The password key is derived once and wraps every file's own data key.
+    Files are encrypted concurrently on the crypto pool, at most
+    VAULT_BULK_UPLOAD_WORKERS at a time so one request cannot take every
+    worker. Returns one result dict per file, in upload order.
+    """
+    key, salt = crypto_executor.run(generate_key, password, request.user.get_key_salt(), session_scope(request))
+    chunk_size = get_chunk_size()
+    
+    futures = []
+    for file in files:
+        running = [future for future in futures if future is not None and not future.done()]
+        if len(running) >= settings.VAULT_BULK_UPLOAD_WORKERS:
+            wait(running, return_when=FIRST_COMPLETED)
+        try:
+            futures.append(crypto_executor.submit(
+                save_encrypted_stream_with_key, file.chunks(chunk_size), key, salt, file.content_type, file,
+                block=True, timeout=settings.VAULT_CRYPTO_QUEUE_WAIT
+            ))
+        except CryptoPoolSaturated:
+            futures.append(None)
+    
+    results = []
+    rows = []
+    for file, future in zip(files, futures):
+        if future is None:
+            results.append({'name': file.name, 'success': False, 'error': 'Server busy, please retry.'})
+            continue
+        try:
+            stored = future.result()
+        except Exception as e:
+            print(f"Error encrypting {file.name}: {str(e)}")
+            results.append({'name': file.name, 'success': False, 'error': 'Encryption failed.'})
+            continue
+        row = EncryptedFile(
+            user=request.user,
+            filename=file.name,
+            original_filename=file.name,
+            file_type=file.content_type or 'application/octet-stream',
+            file_size=file.size,
+            **stored
+        )
+        rows.append(row)
+        results.append({'name': file.name, 'success': True, 'row': row})
+    
+    try:
+        with transaction.atomic():
+            EncryptedFile.objects.bulk_create(rows)
+            record_uploads(rows)
+            logs = [build_access_log(request, row, 'upload') for row in rows]
+            FileAccessLog.objects.bulk_create(logs)
+            record_activity(logs)
+    except Exception:
+        for row in rows:
+            delete_ciphertext(row)
+        raise
+    bump_user_cache_version(request.user.pk)
+    
+    for result in results:
+        row = result.pop('row', None)
+        if row is not None:
+            result.update(id=row.id, size=row.file_size)
+    return results
+
+def _file_listing(user, cursor):
+    """One keyset page of a user's file metadata plus their totals.
+
+    Cached per user and cursor until their next upload or delete.
+    """
+    def load():
+        # Fetch only the metadata columns for one keyset page of the user's files
+        user_files = EncryptedFile.objects.filter(user=user)
+        files, next_cursor = paginate_keyset(
+            user_files.only(*EncryptedFile.LISTING_FIELDS), cursor, settings.VAULT_FILES_PER_PAGE,
+        )
+        # Count and total size come from the denormalized stats row
+        stats = get_storage_stats(user)
+        return files, next_cursor, stats.file_count, stats.total_bytes
+    
+    return cached_for_user(user.pk, 'file-listing', load, cursor or '', settings.VAULT_FILES_PER_PAGE)
 
 @login_required
 def file_list(request):
@@ -73,20 +247,17 @@ def file_list(request):
             os.makedirs(encrypted_files_path, exist_ok=True)
             print(f"Created encrypted files directory at {encrypted_files_path}")
         
-        # Get user's files
-        files = EncryptedFile.objects.filter(user=request.user).order_by('-created_at')
-        file_count = files.count()
-        print(f"Found {file_count} files for user {request.user.username}")
-        
-        # Calculate total size
-        total_size = files.aggregate(total=Sum('file_size'))['total'] or 0
+        files, next_cursor, total_files, total_size = _file_listing(request.user, request.GET.get('cursor'))
         
         # Prepare context
         context = {
             'files': files,
+            'next_cursor': next_cursor,
+            'is_first_page': not request.GET.get('cursor'),
             'total_size': total_size,
-            'total_files': file_count,
-            'user': request.user
+            'total_files': total_files,
+            'user': request.user,
+            **fragment_context(request.user.pk)
         }
         
         return render(request, 'vault/file_list.html', context)
@@ -96,6 +267,33 @@ def file_list(request):
         messages.error(request, 'An error occurred while loading your files. Please try again.')
         return redirect('dashboard')
 
+def _verified_key(encrypted_file, password, cache_scope):
+    """Derive the password key once and check it, raising ValueError if it is wrong."""
+    key, _ = generate_key(password, bytes(encrypted_file.salt), cache_scope)
+    if not verify_key(encrypted_file, key):
+        raise ValueError('Invalid password')
+    return key
+
+def _open_verified_stream(encrypted_file, password, cache_scope):
+    """Check the password, then decrypt the first chunk of the file."""
+    key = _verified_key(encrypted_file, password, cache_scope)
+    if needs_upgrade(encrypted_file) and settings.VAULT_LAZY_UPGRADE:
+        # Legacy CBC files are rewritten in the current format as they stream
+        return iter_upgrading_file_with_key(encrypted_file, key)
+    return iter_decrypted_file_with_key(encrypted_file, unwrap_file_key(encrypted_file, key))
+
+def _crypto_busy(request, wants_json=False):
+    """503 response for when the crypto pool has no free capacity."""
+    if wants_json:
+        response = JsonResponse({
+            'success': False,
+            'message': 'The server is busy. Please try again shortly.'
+        }, status=503)
+    else:
+        response = render(request, 'vault/busy.html', status=503)
+    response['Retry-After'] = str(settings.VAULT_CRYPTO_RETRY_AFTER)
+    return response
+
 @login_required
 def download_file(request, file_id):
     try:
@@ -108,45 +306,36 @@ def download_file(request, file_id):
             form = FileDownloadForm(request.POST)
             if form.is_valid():
                 try:
-                    # Check if encrypted data exists in database
-                    if not encrypted_file.encrypted_data:
+                    # Check the password and decrypt the first chunk on the crypto pool;
+                    # the remaining chunks are decrypted as the response streams
+                    try:
+                        decrypted_chunks = crypto_executor.run(
+                            _open_verified_stream, encrypted_file, form.cleaned_data['password'], session_scope(request)
+                        )
+                    except FileNotFoundError:
                         print(f"ERROR: Encrypted data not found for file_id={file_id}")
                         messages.error(request, 'File data not found. It may have been corrupted.')
                         return redirect('file-list')
                     
-                    # Convert salt and IV from bytes (already in correct format from DB)
-                    # Decrypt file from database
-                    from .utils import decrypt_file
-                    decrypted_content = decrypt_file(
-                        encrypted_file.encrypted_data,
-                        form.cleaned_data['password'],
-                        bytes(encrypted_file.salt),
-                        bytes(encrypted_file.iv)
-                    )
-                    
-                    print(f"File decrypted successfully: {encrypted_file.original_filename}")
+                    print(f"File decryption started: {encrypted_file.original_filename}")
                     
                     # Log access
-                    FileAccessLog.objects.create(
-                        file=encrypted_file,
-                        user=request.user,
-                        access_type=action,
-                        ip_address=request.META.get('REMOTE_ADDR'),
-                        user_agent=request.META.get('HTTP_USER_AGENT')
-                    )
+                    log_access(request, encrypted_file, action)
                     
-                    # Prepare response
+                    # Stream the plaintext, decrypted on the crypto pool; the size is known from the stored metadata
                     content_type = encrypted_file.file_type
-                    response = HttpResponse(decrypted_content, content_type=content_type)
+                    response = StreamingHttpResponse(crypto_executor.iterate(decrypted_chunks), content_type=content_type)
+                    response['Content-Length'] = str(encrypted_file.file_size)
                     
-                    if action == 'download':
-                        response['Content-Disposition'] = f'attachment; filename="{encrypted_file.original_filename}"'
-                    else:
-                        # For viewing, use inline disposition
-                        response['Content-Disposition'] = f'inline; filename="{encrypted_file.original_filename}"'
+                    # Inline for viewing; the header encodes any quotes or non-ASCII in the name
+                    response['Content-Disposition'] = content_disposition_header(
+                        action == 'download', encrypted_file.original_filename
+                    )
                     
                     return response
                 
+                except CryptoPoolSaturated:
+                    return _crypto_busy(request)
                 except ValueError as e:
                     print(f"ERROR: Decryption failed - {str(e)}")
                     messages.error(request, 'Invalid password. Please try again.')
@@ -177,6 +366,71 @@ def download_file(request, file_id):
         messages.error(request, 'An error occurred loading the file.')
         return redirect('file-list')
 
+@login_required
+@require_safe
+def download_ciphertext(request, file_id):
+    """Serve a browser-encrypted file's stored bytes unchanged, for the browser to decrypt."""
+    encrypted_file = get_object_or_404(
+        EncryptedFile.objects.defer('encrypted_data'), id=file_id, user=request.user, client_encrypted=True
+    )
+    action = 'view' if request.GET.get('action') == 'view' else 'download'
+
+    try:
+        chunks = iter_blob(encrypted_file.blob_key)
+    except FileNotFoundError:
+        print(f"ERROR: Encrypted data not found for file_id={file_id}")
+        return JsonResponse({'success': False, 'message': 'File data not found.'}, status=404)
+
+    log_access(request, encrypted_file, action)
+
+    response = StreamingHttpResponse(chunks, content_type='application/octet-stream')
+    response['Content-Length'] = str(get_blob_store().size(encrypted_file.blob_key))
+    response['Cache-Control'] = 'private, no-store'
+    return response
+
+def _read_verified_thumbnail(encrypted_file, password, cache_scope):
+    """Check the password, then decrypt the file's preview."""
+    key = _verified_key(encrypted_file, password, cache_scope)
+    return read_thumbnail_with_key(encrypted_file, unwrap_file_key(encrypted_file, key))
+
+@login_required
+def preview_file(request, file_id):
+    encrypted_file = get_object_or_404(
+        EncryptedFile.objects.defer('encrypted_data'), id=file_id, user=request.user
+    )
+    if not encrypted_file.thumbnail_key:
+        messages.error(request, 'No preview is available for this file.')
+        return redirect('file-list')
+    
+    if request.method == 'POST':
+        form = FileDownloadForm(request.POST)
+        if form.is_valid():
+            try:
+                # Only the few-kilobyte preview is decrypted, never the original
+                thumbnail = crypto_executor.run(
+                    _read_verified_thumbnail, encrypted_file, form.cleaned_data['password'], session_scope(request)
+                )
+                log_access(request, encrypted_file, 'view')
+                response = HttpResponse(thumbnail, content_type='image/jpeg')
+                response['Content-Disposition'] = f'inline; filename="preview-{encrypted_file.id}.jpg"'
+                response['Cache-Control'] = 'private, no-store'
+                return response
+            except CryptoPoolSaturated:
+                return _crypto_busy(request)
+            except ValueError:
+                messages.error(request, 'Invalid password. Please try again.')
+            except FileNotFoundError:
+                messages.error(request, 'Preview data not found.')
+                return redirect('file-list')
+    else:
+        form = FileDownloadForm()
+    
+    return render(request, 'vault/file_access.html', {
+        'form': form,
+        'file': encrypted_file,
+        'action': 'preview'
+    })
+
 @login_required
 def delete_file(request, file_id):
     encrypted_file = get_object_or_404(EncryptedFile, id=file_id, user=request.user)
@@ -185,33 +439,25 @@ def delete_file(request, file_id):
         form = FileDownloadForm(request.POST)
         if form.is_valid():
             try:
-                # Convert salt and IV from bytes (already in correct format from DB)
-                # Verify password by attempting decryption
-                from .utils import decrypt_file
-                try:
-                    decrypt_file(
-                        encrypted_file.encrypted_data,
-                        form.cleaned_data['password'],
-                        bytes(encrypted_file.salt),
-                        bytes(encrypted_file.iv)
-                    )
-                except Exception:
+                # Verify password against the stored key check; no decryption needed
+                if not crypto_executor.run(
+                    verify_password, encrypted_file, form.cleaned_data['password'], session_scope(request)
+                ):
                     messages.error(request, 'Invalid password.')
                     return redirect('file-list')
                 
-                # Delete database record (encrypted_data is in DB, no filesystem cleanup needed)
-                encrypted_file.delete()
+                # Delete database record; its stored ciphertext goes once this commits
+                with transaction.atomic():
+                    encrypted_file.delete()
+                    record_delete(encrypted_file)
+                bump_user_cache_version(request.user.pk)
                 
-                # Log deletion
-                FileAccessLog.objects.create(
-                    file=encrypted_file,
-                    user=request.user,
-                    access_type='delete',
-                    ip_address=request.META.get('REMOTE_ADDR'),
-                    user_agent=request.META.get('HTTP_USER_AGENT')
-                )
+                # Log deletion; entries keep the file's name after it is gone
+                log_access(request, encrypted_file, 'delete')
                 
                 messages.success(request, 'File deleted successfully.')
+            except CryptoPoolSaturated:
+                return _crypto_busy(request)
             except Exception as e:
                 print(f"Error deleting file: {str(e)}")
                 messages.error(request, 'Error deleting file. Please try again.')
@@ -225,10 +471,128 @@ def delete_file(request, file_id):
     
     return redirect('file-list')
 
+@login_required
+def rekey_vault(request):
+    if request.method == 'POST':
+        form = RekeyForm(request.POST)
+        if form.is_valid():
+            try:
+                # Only wrapped data keys change: one KDF per password salt, then small row updates
+                files = list(EncryptedFile.objects.filter(user=request.user).defer('encrypted_data'))
+                rekeyed, skipped = crypto_executor.run(
+                    rekey_files, files, form.cleaned_data['old_password'], form.cleaned_data['new_password'],
+                    request.user.get_key_salt(), session_scope(request)
+                )
+                changed = _save_rekeyed(rekeyed)
+                skipped += changed
+                rekeyed = [f for f in rekeyed if f not in changed]
+                
+                if rekeyed:
+                    messages.success(request, f'Password changed for {len(rekeyed)} file(s).')
+                else:
+                    messages.error(request, 'No files matched the current password.')
+                if skipped:
+                    messages.info(request, f'{len(skipped)} file(s) use a different password and were left unchanged.')
+                return redirect('file-list')
+            
+            except CryptoPoolSaturated:
+                return _crypto_busy(request)
+            except Exception as e:
+                print(f"Error re-keying files: {str(e)}")
+                import traceback
+                traceback.print_exc()
+                messages.error(request, 'Error changing the password. Please try again.')
+                return redirect('rekey-vault')
+    else:
+        form = RekeyForm()
+    
+    return render(request, 'vault/rekey.html', {'form': form})
+
+def _save_rekeyed(rekeyed) -> list:
+    """Save new key material, returning the files whose ciphertext changed meanwhile.
+
+    A lazy upgrade can swap in a new blob and data key while the re-key
+    runs, so each row is only updated if its blob and format are the ones
+    the new key material was computed for.
+    """
+    changed = []
+    with transaction.atomic():
+        for encrypted_file in rekeyed:
+            updated = EncryptedFile.objects.filter(
+                pk=encrypted_file.pk, blob_key=encrypted_file.blob_key, format_version=encrypted_file.format_version
+            ).update(
+                wrapped_key=encrypted_file.wrapped_key,
+                salt=encrypted_file.salt,
+                key_check=encrypted_file.key_check,
+            )
+            if not updated:
+                changed.append(encrypted_file)
+    return changed
+
+def _page_links(request, next_cursor):
+    """Query strings for the first and next keyset pages, keeping the active filters."""
+    query = request.GET.copy()
+    query.pop('cursor', None)
+    first_query = query.urlencode()
+    next_query = None
+    if next_cursor:
+        query['cursor'] = next_cursor
+        next_query = query.urlencode()
+    return {
+        'first_query': first_query,
+        'next_query': next_query,
+        'is_first_page': not request.GET.get('cursor'),
+    }
+
+@login_required
+def file_search(request):
+    files = EncryptedFile.objects.none()
+    search_form = FileSearchForm(request.GET)
+    if search_form.is_valid():
+        files = search_form.search(request.user)
+    
+    files, next_cursor = paginate_keyset(
+        files.only(*EncryptedFile.LISTING_FIELDS), request.GET.get('cursor'), settings.VAULT_FILES_PER_PAGE
+    )
+    
+    return render(request, 'vault/search.html', {
+        'files': files,
+        'search_form': search_form,
+        **_page_links(request, next_cursor),
+    })
+
 @login_required
 def access_logs(request):
-    logs = FileAccessLog.objects.filter(
-        file__user=request.user
-    ).select_related('file', 'user').order_by('-timestamp')
+    # Owner is denormalized onto the log, so no join through EncryptedFile is needed
+    logs = FileAccessLog.objects.filter(owner=request.user).only(
+        'id', 'access_type', 'file_name', 'file_type', 'timestamp', 'ip_address', 'user_agent'
+    )
     
-    return render(request, 'vault/access_logs.html', {'logs': logs})
+    # Archived entries only survive as daily counts
+    rollups = AccessLogRollup.objects.filter(owner=request.user)
+    
+    filter_form = AccessLogFilterForm(request.GET)
+    if filter_form.is_valid():
+        logs = filter_form.filter(logs)
+        rollups = filter_form.filter_rollups(rollups)
+    
+    logs, next_cursor = paginate_keyset(
+        logs, request.GET.get('cursor'), settings.VAULT_LOGS_PER_PAGE, key_fields=('timestamp', 'id')
+    )
+    
+    # Older history follows the last page of individual entries
+    archived_days = [] if next_cursor else daily_summary(rollups, settings.VAULT_LOGS_PER_PAGE)
+    
+    return render(request, 'vault/access_logs.html', {
+        'logs': logs,
+        'archived_days': archived_days,
+        'filter_form': filter_form,
+        **_page_links(request, next_cursor),
+    })
+
+@user_passes_test(lambda u: u.is_staff)
+def vault_metrics(request):
+    return JsonResponse({
+        'access_log': access_log_writer.metrics(),
+        'crypto_pool': crypto_executor.metrics(),
+    })